@@ -0,0 +1,384 @@
+import json
+import os
+import time
+import itertools
+import numpy as np
+import psycopg2
+from datetime import datetime, timezone
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, X-Session-Id',
+    'Access-Control-Max-Age': '86400',
+    'Content-Type': 'application/json'
+}
+
+WEIGHT_KEYS = ['ratingWeight', 'winrateWeight', 'formWeight', 'oddsWeight']
+THRESHOLD_KEYS = ['strongThreshold', 'mediumThreshold', 'riskyThreshold']
+
+DEFAULT_GRID = {
+    'ratingWeight': [4.0],
+    'winrateWeight': [3.5],
+    'formWeight': [2.8],
+    'oddsWeight': [1.2],
+    'strongThreshold': [78],
+    'mediumThreshold': [67],
+    'riskyThreshold': [56]
+}
+
+MAX_COMBINATIONS = 20000
+COMBO_CHUNK = 256
+DATASET_TTL_SECONDS = 300
+
+dataset_cache = {}
+
+
+def handler(event, context):
+    """Бэктест весов и порогов прогноза по истории predictions"""
+
+    if event.get('httpMethod') == 'OPTIONS':
+        return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': ''}
+
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return {
+            'statusCode': 500,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'error': 'DATABASE_URL not configured'}, ensure_ascii=False)
+        }
+
+    params = event.get('queryStringParameters') or {}
+    body = {}
+    if event.get('body'):
+        body = json.loads(event['body'])
+
+    try:
+        grid = parse_grid(params, body)
+        days = parse_int(body, params, 'days', 365, 1)
+        min_bets = parse_int(body, params, 'minBets', 30, 0)
+        top = parse_int(body, params, 'top', 20, 1)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
+        }
+
+    started = time.time()
+    data = load_dataset(db_url, days)
+    loaded_ms = round((time.time() - started) * 1000)
+
+    if data['n'] == 0:
+        return {
+            'statusCode': 200,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'rows': 0, 'combinations': 0, 'results': []}, ensure_ascii=False)
+        }
+
+    started = time.time()
+    results = run_sweep(data, grid, min_bets, top)
+    baseline = evaluate_single(data, {k: v[0] for k, v in DEFAULT_GRID.items()})
+    sweep_ms = round((time.time() - started) * 1000)
+
+    return {
+        'statusCode': 200,
+        'headers': CORS_HEADERS,
+        'body': json.dumps({
+            'rows': data['n'],
+            'days': days,
+            'combinations': results['combinations'],
+            'baseline': baseline,
+            'results': results['top'],
+            'loadMs': loaded_ms,
+            'sweepMs': sweep_ms,
+            'updatedAt': datetime.now(timezone.utc).isoformat()
+        }, ensure_ascii=False)
+    }
+
+
+def parse_grid(params, body):
+    """Сетка параметров: списки из body или через запятую в query, по умолчанию — текущие веса"""
+    grid = {}
+    for key, default in DEFAULT_GRID.items():
+        value = body.get(key, params.get(key))
+        try:
+            if value is None:
+                grid[key] = default
+            elif isinstance(value, list):
+                grid[key] = [float(v) for v in value]
+            else:
+                grid[key] = [float(v) for v in str(value).split(',') if v.strip()]
+        except (TypeError, ValueError):
+            raise ValueError(f'Некорректные значения для {key}')
+        if not grid[key]:
+            raise ValueError(f'Пустой список значений для {key}')
+
+    total = 1
+    for values in grid.values():
+        total *= len(values)
+    if total > MAX_COMBINATIONS:
+        raise ValueError(f'Слишком много комбинаций: {total} (максимум {MAX_COMBINATIONS})')
+
+    return grid
+
+
+def parse_int(body, params, key, default, minimum):
+    """Целый параметр из body или query; некорректное значение — ValueError (400)"""
+    try:
+        value = int(body.get(key, params.get(key, default)))
+    except (TypeError, ValueError):
+        raise ValueError(f'Некорректное значение {key}')
+    if value < minimum:
+        raise ValueError(f'{key} должен быть не меньше {minimum}')
+    return value
+
+
+def js_hash(s):
+    """Порт hash() из src/data/matches.ts (int32, UTF-16 code units)"""
+    h = 0
+    units = s.encode('utf-16-le')
+    for i in range(0, len(units), 2):
+        h = ((h << 5) - h + (units[i] | (units[i + 1] << 8))) & 0xFFFFFFFF
+    if h >= 0x80000000:
+        h -= 0x100000000
+    return format(abs(h), 'x').rjust(8, '0')
+
+
+def player_features(name):
+    """rating, winRate и число побед в форме — так же, как их считает фронтенд"""
+    hx = js_hash(name)
+    rating = 1700 + int(hx[:6], 16) % 300
+    winrate = np.floor((50 + ((rating - 1700) / 300) * 30) * 10 + 0.5) / 10
+    wins = sum(1 for c in hx[:5] if int(c, 16) > 7)
+    return rating, winrate, wins
+
+
+def load_dataset(db_url, days):
+    """Рассчитанные прогнозы в колоночном виде (NumPy), кэшируются между вызовами"""
+    cached = dataset_cache.get(days)
+    if cached and time.time() - cached['loadedAt'] < DATASET_TTL_SECONDS:
+        return cached
+
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT match_name, league, actual_winner, p1_odds, p2_odds
+        FROM predictions
+        WHERE is_correct IS NOT NULL
+          AND actual_winner IS NOT NULL
+          AND match_start_time >= NOW() - %s * INTERVAL '1 day'
+    """, (days,))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    players = {}
+    features = []
+    p1_won = []
+    odds = []
+    leagues = []
+
+    for match_name, league, actual_winner, p1_odds, p2_odds in rows:
+        names = match_name.split(' vs ', 1)
+        if len(names) != 2 or actual_winner not in names:
+            continue
+        p1, p2 = names
+        for name in names:
+            if name not in players:
+                players[name] = player_features(name)
+        r1, wr1, f1 = players[p1]
+        r2, wr2, f2 = players[p2]
+        features.append((r1 - r2, wr1 - wr2, f1 - f2))
+        odds.append((float(p1_odds or 1.8), float(p2_odds or 1.8)))
+        p1_won.append(actual_winner == p1)
+        leagues.append(league)
+
+    n = len(features)
+    raw = np.array(features, dtype=np.float64).reshape(n, 3)
+    odds_arr = np.array(odds, dtype=np.float64).reshape(n, 2)
+    rd, wd, fd = raw[:, 0], raw[:, 1], raw[:, 2]
+    od = odds_arr[:, 0] - odds_arr[:, 1]
+
+    # Те же пороги срабатывания факторов, что в predict() — умножаются на веса из сетки
+    x = np.column_stack([
+        np.where(np.abs(rd) > 10, rd / 50, 0.0),
+        np.where(np.abs(wd) > 1, wd / 10, 0.0),
+        np.where(np.abs(fd) >= 1, fd * 0.5, 0.0),
+        np.where(np.abs(od) > 0.5, np.where(od > 0, -1.0, 1.0), 0.0)
+    ]) if n else np.zeros((0, 4))
+
+    league_names, league_idx = np.unique(np.array(leagues, dtype=object), return_inverse=True) if n else ([], np.zeros(0, dtype=np.int64))
+
+    data = {
+        'n': n,
+        'x': x,
+        'p1Won': np.array(p1_won, dtype=bool),
+        'p1Odds': odds_arr[:, 0],
+        'p2Odds': odds_arr[:, 1],
+        'leagueNames': [str(name) for name in league_names],
+        'leagueIdx': league_idx,
+        'loadedAt': time.time()
+    }
+    dataset_cache[days] = data
+    print(f'Backtest dataset: {n} rows, {len(players)} players')
+    return data
+
+
+def confidence(score):
+    """Math.round(50 + |score| * 4.5), ограниченный 48..96, как во фронтенде"""
+    return np.clip(np.floor(50 + np.abs(score) * 4.5 + 0.5), 48, 96)
+
+
+def run_sweep(data, grid, min_bets, top):
+    """Векторный перебор весов × riskyThreshold: только они меняют набор ставок и прибыль.
+
+    strong/medium лишь делят ставки на bet_type, поэтому не ранжируются, а для лучших
+    комбинаций отдаются разбивкой по каждой паре порогов из сетки.
+    """
+    weights = np.array(list(itertools.product(*[grid[k] for k in WEIGHT_KEYS])), dtype=np.float64)
+    pairs = [
+        (strong, medium)
+        for strong, medium in itertools.product(grid['strongThreshold'], grid['mediumThreshold'])
+        if strong >= medium
+    ]
+    risky = np.array(sorted({
+        r for r in grid['riskyThreshold'] if any(medium >= r for _, medium in pairs)
+    }), dtype=np.float64)
+    if not len(risky):
+        return {'combinations': 0, 'top': []}
+
+    x = data['x']
+    p1_won = data['p1Won'][:, None]
+    p1_odds = data['p1Odds'][:, None]
+    p2_odds = data['p2Odds'][:, None]
+
+    r_count = len(risky)
+    w_count = len(weights)
+
+    bets = np.zeros((w_count, r_count))
+    profit = np.zeros((w_count, r_count))
+
+    for start in range(0, w_count, COMBO_CHUNK):
+        chunk = weights[start:start + COMBO_CHUNK]
+        score = x @ chunk.T
+        conf = confidence(score)
+        pick_p1 = score >= 0
+        correct = pick_p1 == p1_won
+        ret = np.where(correct, np.where(pick_p1, p1_odds, p2_odds), 0.0) - 1.0
+
+        # Ставка делается для всего, что не skip, т.е. conf >= riskyThreshold
+        for ri in range(r_count):
+            mask = conf >= risky[ri]
+            end = start + len(chunk)
+            bets[start:end, ri] = mask.sum(axis=0)
+            profit[start:end, ri] = np.where(mask, ret, 0.0).sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        roi = np.where(bets > 0, profit / bets * 100, np.nan)
+    roi = np.where(bets >= min_bets, roi, np.nan).ravel()
+
+    order = np.argsort(-np.nan_to_num(roi, nan=-np.inf))
+    ranked = [i for i in order[:top] if not np.isnan(roi[i])]
+
+    results = []
+    for flat in ranked:
+        wi, ri = divmod(int(flat), r_count)
+        risky_value = float(risky[ri])
+        valid = [(strong, medium) for strong, medium in pairs if medium >= risky_value]
+        combo = dict(zip(WEIGHT_KEYS, weights[wi].tolist()))
+        combo.update(zip(THRESHOLD_KEYS, (*valid[0], risky_value)))
+        result = evaluate_single(data, combo)
+        conf, correct, ret = predict(data, combo)
+        result['thresholds'] = [
+            {
+                'strongThreshold': strong,
+                'mediumThreshold': medium,
+                'byBetType': bet_type_breakdown(conf, correct, ret, strong, medium, risky_value)
+            }
+            for strong, medium in valid
+        ]
+        results.append(result)
+
+    return {'combinations': w_count * r_count, 'top': results}
+
+
+def predict(data, combo):
+    """Уверенность, попадание и доход на единичную ставку для весов комбинации"""
+    w = np.array([combo[k] for k in WEIGHT_KEYS], dtype=np.float64)
+    score = data['x'] @ w
+    conf = confidence(score)
+    pick_p1 = score >= 0
+    correct = pick_p1 == data['p1Won']
+    ret = np.where(correct, np.where(pick_p1, data['p1Odds'], data['p2Odds']), 0.0) - 1.0
+    return conf, correct, ret
+
+
+def bet_types(conf, strong, medium, risky):
+    """0 — strong, 1 — medium, 2 — risky, 3 — skip"""
+    return np.select([conf >= strong, conf >= medium, conf >= risky], [0, 1, 2], default=3)
+
+
+def summary(mask, conf, correct, ret):
+    n = int(mask.sum())
+    if n == 0:
+        return {'bets': 0, 'winRate': 0, 'roi': 0, 'brier': None}
+    return {
+        'bets': n,
+        'winRate': round(float(correct[mask].mean() * 100), 1),
+        'roi': round(float(ret[mask].sum() / n * 100), 1),
+        'brier': round(float(((conf[mask] / 100 - correct[mask]) ** 2).mean()), 4)
+    }
+
+
+def bet_type_breakdown(conf, correct, ret, strong, medium, risky):
+    bet_type = bet_types(conf, strong, medium, risky)
+    return {
+        name: summary(bet_type == code, conf, correct, ret)
+        for code, name in enumerate(['strong', 'medium', 'risky'])
+    }
+
+
+def evaluate_single(data, combo):
+    """Подробный отчёт по одной комбинации: итог, bet_type, лиги и калибровка"""
+    conf, correct, ret = predict(data, combo)
+    thresholds = [combo[k] for k in THRESHOLD_KEYS]
+    placed = bet_types(conf, *thresholds) < 3
+    by_bet_type = bet_type_breakdown(conf, correct, ret, *thresholds)
+
+    league_idx = data['leagueIdx']
+    league_count = len(data['leagueNames'])
+    n_bets = np.bincount(league_idx, weights=placed, minlength=league_count)
+    n_wins = np.bincount(league_idx, weights=placed & correct, minlength=league_count)
+    n_profit = np.bincount(league_idx, weights=np.where(placed, ret, 0.0), minlength=league_count)
+    by_league = [
+        {
+            'league': data['leagueNames'][i],
+            'bets': int(n_bets[i]),
+            'winRate': round(float(n_wins[i] / n_bets[i] * 100), 1),
+            'roi': round(float(n_profit[i] / n_bets[i] * 100), 1)
+        }
+        for i in np.argsort(-n_bets) if n_bets[i] > 0
+    ]
+
+    bucket = ((conf - 45) // 5).astype(np.int64)
+    b_total = np.bincount(bucket, weights=placed, minlength=11)
+    b_correct = np.bincount(bucket, weights=placed & correct, minlength=11)
+    b_conf = np.bincount(bucket, weights=np.where(placed, conf, 0.0), minlength=11)
+    calibration = [
+        {
+            'bucket': f'{45 + i * 5}-{49 + i * 5}',
+            'total': int(b_total[i]),
+            'predicted': round(float(b_conf[i] / b_total[i]), 1),
+            'actual': round(float(b_correct[i] / b_total[i] * 100), 1)
+        }
+        for i in range(len(b_total)) if b_total[i] > 0
+    ]
+
+    return {
+        'params': combo,
+        'overall': summary(placed, conf, correct, ret),
+        'byBetType': by_bet_type,
+        'byLeague': by_league,
+        'calibration': calibration
+    }
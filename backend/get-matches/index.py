@@ -1,11 +1,19 @@
 import json
+import math
 import os
 import urllib.request
 import urllib.parse
 import ssl
 import re
+import functools
 import http.cookiejar
-from datetime import datetime, timezone
+import time
+import threading
+import psycopg2
+import psycopg2.extras
+from json.encoder import encode_basestring
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait as futures_wait
+from datetime import datetime, timezone, timedelta
 
 CORS_HEADERS = {
     'Access-Control-Allow-Origin': '*',
@@ -19,6 +27,198 @@ UA = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like
 
 liga_stavok_cookies = None
 
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_BASE_COOLDOWN = 60
+BREAKER_MAX_COOLDOWN = 900
+BREAKER_PROBE_TIMEOUT = 30
+
+source_breakers = {}
+source_breakers_loaded = False
+breakers_lock = threading.Lock()
+
+LIVE_REFRESH_SECONDS = 15
+SCHEDULE_REFRESH_SECONDS = 600
+SCHEDULE_MAX_RANGE_DAYS = 7
+SCHEDULE_DAYS = max(1, min(SCHEDULE_MAX_RANGE_DAYS, int(os.environ.get('SCHEDULE_PREFETCH_DAYS', '2'))))
+SCHEDULE_ROLLOVER_WARMUP_SECONDS = 1800
+SCHEDULE_ROLLOVER_REFRESH_SECONDS = 300
+
+live_store = {}
+schedule_store = {}
+schedule_lock = threading.Lock()
+
+MATCHES_DEADLINE_SECONDS = float(os.environ.get('MATCHES_DEADLINE_SECONDS', '8'))
+SNAPSHOT_LIMIT = 500
+SNAPSHOT_RETENTION_DAYS = 2
+# Live-строка снапшота без обновления дольше этого — матч пропал из ленты, не отдаём как live
+SNAPSHOT_LIVE_MAX_AGE_SECONDS = 600
+# Scheduled-строка, не попавшая в последние сборы своего источника, считается пропавшей
+SNAPSHOT_MISSING_GRACE_SECONDS = 300
+
+executor = ThreadPoolExecutor(max_workers=4)
+writer_executor = ThreadPoolExecutor(max_workers=2)
+collect_future = None
+collect_lock = threading.Lock()
+prefetch_executor = ThreadPoolExecutor(max_workers=3)
+prefetch_inflight = set()
+prefetch_lock = threading.Lock()
+
+FRAGMENT_TTL_SECONDS = 600
+
+ODDS_MINUTE_AFTER = '1 hour'
+ODDS_SET_AFTER = '1 day'
+ODDS_DOWNSAMPLE_SECONDS = 600
+ODDS_MAX_HUNDREDTHS = 32767
+
+last_odds = {}
+odds_downsampled_at = 0.0
+
+fragment_cache = {}
+# Рендер идёт и из collect, и из запросов диапазона расписания в потоках обработчика
+fragment_lock = threading.Lock()
+player_features_cache = {}
+
+QUOTA_SAFETY_REQUESTS = 10
+QUOTA_SCHEDULE_SHARE = 0.25
+QUOTA_SYNC_SECONDS = 60
+QUOTA_BLOCKED = float('inf')
+# Остаток известен, а время сброса нет (429 без заголовков): считаем окно суточным,
+# а при исчерпанной квоте live не запрашиваем и лишь изредка обновляем расписание,
+# чтобы узнать новые заголовки квоты
+QUOTA_ASSUMED_RESET_SECONDS = 86400
+QUOTA_PROBE_SECONDS = 1800
+
+api_quota = {'remaining': None, 'limit': None, 'resetAt': 0.0, 'updatedAt': 0.0, 'syncedAt': 0.0}
+quota_lock = threading.Lock()
+
+# Статусы API-Football: неизвестный код считается не начавшимся матчем, а не live
+APIFOOTBALL_FINISHED = {'FT', 'AET', 'AOT', 'AP', 'AW', 'AWD', 'WO'}
+APIFOOTBALL_DROPPED = {'CANC', 'PST', 'ABD', 'SUSP', 'INT'}
+APIFOOTBALL_SCHEDULED = {'', 'NS', 'TBD'}
+APIFOOTBALL_LIVE = {'LIVE', 'IN', 'BT', 'HT', 'ET', 'OT', 'BP'} | {f'{p}{i}' for p in 'SQP' for i in range(1, 8)}
+
+PLAYER_INDEX_TTL_SECONDS = 600
+
+player_index = {}
+short_index = {}
+player_index_loaded_at = 0.0
+player_index_lock = threading.Lock()
+
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya', 'і': 'i', 'ў': 'u'
+})
+
+
+class Event:
+    """Матч во внутреннем формате, общий для всех источников"""
+    
+    __slots__ = (
+        'id', 'date', 'status', 'league', 'country',
+        'home_id', 'home_name', 'away_id', 'away_name',
+        'home_score', 'away_score',
+        'source', 'home_player_id', 'away_player_id', 'sets', 'prediction',
+        'p1_odds', 'p2_odds'
+    )
+    
+    def __init__(self, id, date, status, league, country, home_id, home_name, away_id, away_name, home_score, away_score,
+                 source='', home_player_id=None, away_player_id=None, sets=(), p1_odds=None, p2_odds=None):
+        self.id = id
+        self.date = date
+        self.status = status
+        self.league = league
+        self.country = country
+        self.home_id = home_id
+        self.home_name = home_name
+        self.away_id = away_id
+        self.away_name = away_name
+        self.home_score = home_score
+        self.away_score = away_score
+        self.source = source
+        self.home_player_id = home_player_id
+        self.away_player_id = away_player_id
+        self.sets = sets
+        self.prediction = None
+        self.p1_odds = p1_odds
+        self.p2_odds = p2_odds
+    
+    @classmethod
+    def from_wire(cls, d, source=''):
+        """Обратное преобразование из JSON-формата ответа (кэш в БД)"""
+        league = d.get('league') or {}
+        teams = d.get('teams') or {}
+        home = teams.get('home') or {}
+        away = teams.get('away') or {}
+        scores = d.get('scores') or {}
+        odds = d.get('odds') or {}
+        return cls(
+            d.get('id', ''), d.get('date', ''), d.get('status', 'scheduled'),
+            league.get('name', ''), league.get('country', ''),
+            home.get('id', ''), home.get('name', ''),
+            away.get('id', ''), away.get('name', ''),
+            scores.get('home', 0), scores.get('away', 0),
+            source, home.get('playerId'), away.get('playerId'),
+            tuple((s.get('p1'), s.get('p2')) for s in d.get('sets') or []),
+            odds.get('p1Win'), odds.get('p2Win')
+        )
+    
+    def to_json(self):
+        """Сериализация в формат ответа без промежуточных dict"""
+        return (
+            f'{{"id":{json_scalar(self.id)},"date":{json_scalar(self.date)},"status":{json_scalar(self.status)},'
+            f'"league":{{"name":{json_scalar(self.league)},"country":{json_scalar(self.country)}}},'
+            f'"teams":{{"home":{{"id":{json_scalar(self.home_id)},"name":{json_scalar(self.home_name)},'
+            f'"playerId":{json_scalar(self.home_player_id)}}},'
+            f'"away":{{"id":{json_scalar(self.away_id)},"name":{json_scalar(self.away_name)},'
+            f'"playerId":{json_scalar(self.away_player_id)}}}}},'
+            f'"scores":{{"home":{json_scalar(self.home_score)},"away":{json_scalar(self.away_score)}}},'
+            f'"sets":{sets_json(self.sets)},'
+            f'"odds":{odds_json(self.p1_odds, self.p2_odds)},'
+            f'"prediction":{json.dumps(self.prediction, ensure_ascii=False) if self.prediction else "null"}}}'
+        )
+
+
+def odds_json(p1_odds, p2_odds):
+    if p1_odds is None or p2_odds is None:
+        return 'null'
+    return f'{{"p1Win":{json_scalar(p1_odds)},"p2Win":{json_scalar(p2_odds)}}}'
+
+
+def sets_json(sets):
+    return '[' + ','.join(f'{{"p1":{json_scalar(p1)},"p2":{json_scalar(p2)}}}' for p1, p2 in sets) + ']'
+
+
+def json_scalar(value):
+    cls = value.__class__
+    if cls is str:
+        return encode_basestring(value)
+    if cls is int:
+        return int.__repr__(value)
+    if value is None:
+        return 'null'
+    if cls is bool:
+        return 'true' if value else 'false'
+    if cls is float:
+        return float.__repr__(value) if value == value else 'null'
+    return encode_basestring(str(value))
+
+
+def render_body(fragments, meta):
+    """JSON ответа: метаданные через json.dumps, события — готовыми фрагментами"""
+    head = json.dumps(meta, ensure_ascii=False)
+    return f'{head[:-1]}, "events": [{",".join(fragments)}]}}'
+
+
+class StaleSourceError(Exception):
+    """Все запросы к источнику упали, но есть устаревшие данные из кэша"""
+
+    def __init__(self, message, events):
+        super().__init__(message)
+        self.events = events
+
 
 def handler(event, context):
     """Получение матчей настольного тенниса через API-Football (RapidAPI)"""
@@ -26,51 +226,1257 @@ def handler(event, context):
     if event.get('httpMethod') == 'OPTIONS':
         return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': ''}
     
+    params = event.get('queryStringParameters') or {}
+    league = params.get('league', '')
+    status = params.get('status', '')
+    
+    if params.get('oddsHistory'):
+        return odds_history_response(params['oddsHistory'], params.get('since'))
+    
     api_key = os.environ.get('RAPID_API_KEY', '')
     
+    if params.get('from') or params.get('to'):
+        load_breakers()
+        return schedule_range_response(api_key, params.get('from'), params.get('to'), league, status)
+    
     print(f'[v3] RAPID_API_KEY present: {bool(api_key)}')
     
-    if api_key:
+    load_breakers()
+    
+    future = submit_collect(api_key)
+    try:
+        events, fragments, source = future.result(timeout=MATCHES_DEADLINE_SECONDS)
+    except FutureTimeout:
+        print(f'[v3] Upstream missed {MATCHES_DEADLINE_SECONDS}s deadline, serving snapshot')
+        return snapshot_response(league, status)
+    except Exception as e:
+        print(f'[v3] Upstream pipeline error: {str(e)}, serving snapshot')
+        return snapshot_response(league, status)
+    
+    if not events:
+        return snapshot_response(league, status)
+    
+    fragments = [
+        fragment for ev, fragment in zip(events, fragments)
+        if event_matches_filter(ev, league, status)
+    ]
+    
+    return {
+        'statusCode': 200,
+        'headers': CORS_HEADERS,
+        'body': render_body(fragments, {
+            'total': len(fragments),
+            'source': source,
+            'sources': breakers_snapshot(),
+            'updatedAt': datetime.now(timezone.utc).isoformat()
+        })
+    }
+
+
+def submit_collect(api_key):
+    """Один сбор на инстанс: пока предыдущий не завершился, новые запросы ждут его же результат"""
+    global collect_future
+    with collect_lock:
+        if collect_future is None or collect_future.done():
+            collect_future = executor.submit(collect_events, api_key)
+        return collect_future
+
+
+def collect_events(api_key):
+    """Сбор событий из upstream; снапшот в БД пишется отдельной задачей, не задерживая ответ"""
+    if api_key and breaker_allows('api-football'):
         print('[v3] Using API-Football Table Tennis (paid)')
-        return handle_paid_api(api_key)
+        events, source = handle_paid_api(api_key)
+    elif api_key:
+        print('[v3] API-Football circuit open, fallback to free scraping')
+        events, source = handle_free_scraping()
     else:
         print('[v3] Using free scraping (limited)')
-        return handle_free_scraping()
+        events, source = handle_free_scraping()
+    
+    fragments = []
+    if events:
+        resolve_players(events)
+        fragments = render_fragments(events)
+        writer_executor.submit(save_snapshot, events, fragments, source)
+        writer_executor.submit(capture_odds, events)
+    
+    return events, fragments, source
 
 
-def handle_paid_api(api_key):
-    """Платный API — API-Football (Table Tennis) через RapidAPI"""
-    all_events = []
+def capture_odds(events):
+    """Запись коэффициентов в odds_history — только при изменении относительно прошлого опроса"""
+    global odds_downsampled_at
     
-    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return
     
-    live_events = fetch_apifootball(api_key, '/games', {'live': 'all', 'timezone': 'Europe/Moscow'})
-    if live_events and 'response' in live_events:
-        all_events.extend(live_events['response'])
-        print(f'API-Football live: {len(live_events["response"])} events')
+    now = datetime.now(timezone.utc)
+    rows = []
+    for ev in events:
+        if ev.p1_odds is None or ev.p2_odds is None or ev.status == 'FT':
+            continue
+        key = f'{ev.source}:{ev.id}'
+        odds = (odds_hundredths(ev.p1_odds), odds_hundredths(ev.p2_odds))
+        if last_odds.get(key) == odds:
+            continue
+        set_no = (ev.home_score or 0) + (ev.away_score or 0) + 1 if ev.status == 'LIVE' else 0
+        rows.append((key, now, odds[0], odds[1], set_no))
     
-    scheduled = fetch_apifootball(api_key, '/games', {'date': today, 'timezone': 'Europe/Moscow'})
-    if scheduled and 'response' in scheduled:
-        all_events.extend(scheduled['response'])
-        print(f'API-Football scheduled: {len(scheduled["response"])} events')
+    downsample = time.time() - odds_downsampled_at > ODDS_DOWNSAMPLE_SECONDS
+    if not rows and not downsample:
+        return
     
-    print(f'Total events from API: {len(all_events)}')
+    try:
+        conn = psycopg2.connect(db_url, connect_timeout=3)
+        cur = conn.cursor()
+        if rows:
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO odds_history (event_id, ts, p1_odds, p2_odds, set_no)
+                VALUES %s
+                ON CONFLICT (event_id, ts) DO NOTHING
+            """, rows)
+        if downsample:
+            downsample_odds(cur)
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f'Odds capture error: {str(e)}')
+        return
     
-    filtered = [ev for ev in all_events if is_liga_pro_apifootball(ev)]
-    print(f'Filtered Liga Pro: {len(filtered)} events')
+    for key, _, p1, p2, _ in rows:
+        last_odds[key] = (p1, p2)
+    if downsample:
+        odds_downsampled_at = time.time()
+    print(f'Odds captured: {len(rows)} ticks')
+
+
+def odds_hundredths(value):
+    """Коэффициент в сотых для SMALLINT; выбросы выше 327.67 обрезаются, а не ломают вставку"""
+    return max(0, min(ODDS_MAX_HUNDREDTHS, round(value * 100)))
+
+
+def downsample_odds(cur):
+    """Тики старше часа → последняя точка в минуту; старше суток → последняя точка на сет.
+    Уже свёрнутые строки события входят в окно, чтобы повторные проходы не плодили точки на тот же бакет."""
+    for resolution, target, bucket, older_than in (
+        ('tick', 'minute', "date_trunc('minute', ts)", ODDS_MINUTE_AFTER),
+        ('minute', 'set', 'set_no', ODDS_SET_AFTER)
+    ):
+        cur.execute(f"""
+            DELETE FROM odds_history o
+            USING (
+                SELECT event_id, ts,
+                       ROW_NUMBER() OVER (PARTITION BY event_id, {bucket} ORDER BY ts DESC) AS rn
+                FROM odds_history
+                WHERE (
+                    (resolution = %s AND ts < NOW() - INTERVAL '{older_than}')
+                    OR (resolution = %s AND event_id IN (
+                        SELECT event_id FROM odds_history
+                        WHERE resolution = %s AND ts < NOW() - INTERVAL '{older_than}'
+                    ))
+                )
+            ) d
+            WHERE o.event_id = d.event_id AND o.ts = d.ts AND d.rn > 1
+        """, (resolution, target, resolution))
+        removed = cur.rowcount
+        cur.execute(f"""
+            UPDATE odds_history SET resolution = %s
+            WHERE resolution = %s AND ts < NOW() - INTERVAL '{older_than}'
+        """, (target, resolution))
+        print(f'Odds downsample {resolution} → {target}: removed {removed}')
+
+
+def odds_history_response(event_id, since):
+    """Движение линии по событию: range scan по первичному ключу (event_id, ts)"""
+    points = []
+    db_url = os.environ.get('DATABASE_URL', '')
+    if db_url:
+        try:
+            conn = psycopg2.connect(db_url, connect_timeout=3)
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT ts, p1_odds, p2_odds, set_no, resolution
+                FROM odds_history
+                WHERE event_id = %s AND ts >= %s
+                ORDER BY ts
+            """, (event_id, since or '1970-01-01'))
+            points = [
+                {
+                    'ts': row[0].isoformat(),
+                    'p1Win': row[1] / 100,
+                    'p2Win': row[2] / 100,
+                    'set': row[3],
+                    'resolution': row[4]
+                }
+                for row in cur.fetchall()
+            ]
+            cur.close()
+            conn.close()
+        except Exception as e:
+            print(f'Odds history error: {str(e)}')
     
     return {
         'statusCode': 200,
         'headers': CORS_HEADERS,
         'body': json.dumps({
-            'events': filtered,
-            'total': len(filtered),
-            'source': 'api-football',
-            'updatedAt': datetime.now(timezone.utc).isoformat()
+            'eventId': event_id,
+            'points': points,
+            'total': len(points)
         }, ensure_ascii=False)
     }
 
 
+def event_state(ev):
+    """Всё, от чего зависят прогноз и JSON события. У Flashscore дата — время опроса, её не учитываем"""
+    return (
+        ev.date if ev.source != 'flashscore' else None,
+        ev.status, ev.league, ev.country,
+        ev.home_id, ev.home_name, ev.away_id, ev.away_name,
+        ev.home_score, ev.away_score, ev.sets,
+        ev.home_player_id, ev.away_player_id,
+        ev.p1_odds, ev.p2_odds
+    )
+
+
+def render_fragments(events):
+    """Прогноз и JSON-фрагмент пересчитываются только для изменившихся событий"""
+    now = time.time()
+    fragments = []
+    changed = 0
+    
+    for ev in events:
+        key = (ev.source, ev.id)
+        state = event_state(ev)
+        with fragment_lock:
+            cached = fragment_cache.get(key)
+            if cached is not None and cached[0] == state:
+                cached[2] = now
+        if cached is None or cached[0] != state:
+            ev.prediction = predict_event(ev)
+            cached = [state, ev.to_json(), now]
+            with fragment_lock:
+                fragment_cache[key] = cached
+            changed += 1
+        fragments.append(cached[1])
+    
+    with fragment_lock:
+        for key in [k for k, v in list(fragment_cache.items()) if now - v[2] > FRAGMENT_TTL_SECONDS]:
+            del fragment_cache[key]
+    
+    print(f'Fragments: {changed}/{len(events)} changed')
+    return fragments
+
+
+def js_hash(s):
+    """Порт hash() из src/data/matches.ts (int32, UTF-16 code units)"""
+    h = 0
+    units = s.encode('utf-16-le')
+    for i in range(0, len(units), 2):
+        h = ((h << 5) - h + (units[i] | (units[i + 1] << 8))) & 0xFFFFFFFF
+    if h >= 0x80000000:
+        h -= 0x100000000
+    return format(abs(h), 'x').rjust(8, '0')
+
+
+def js_round(x, digits=0):
+    """Math.round(x * 10^digits) / 10^digits"""
+    k = 10 ** digits
+    value = math.floor(x * k + 0.5) / k
+    return int(value) if value == int(value) else value
+
+
+def player_features(name):
+    """rating, winRate, форма — как rating()/winrate()/form() во фронтенде"""
+    cached = player_features_cache.get(name)
+    if cached:
+        return cached
+    hx = js_hash(name)
+    rating = 1700 + int(hx[:6], 16) % 300
+    winrate = js_round(50 + ((rating - 1700) / 300) * 30, 1)
+    wins = sum(1 for c in hx[:5] if int(c, 16) > 7)
+    cached = (rating, winrate, wins)
+    player_features_cache[name] = cached
+    return cached
+
+
+def model_odds(r1, r2):
+    p1 = 1.0 / (1.0 + math.pow(10, -(r1 - r2) / 400))
+    m = 0.06
+    return (
+        js_round(max(1.05, min(8.0, 1.0 / (p1 + m / 2))), 2),
+        js_round(max(1.05, min(8.0, 1.0 / (1 - p1 + m / 2))), 2)
+    )
+
+
+def predict_event(ev):
+    """Порт predict() из src/data/matches.ts, включая live-фактор по текущему счёту"""
+    n1, n2 = str(ev.home_name), str(ev.away_name)
+    if not n1 or not n2:
+        return None
+    r1, wr1, f1 = player_features(n1)
+    r2, wr2, f2 = player_features(n2)
+    first1, first2 = n1.split(' ')[0], n2.split(' ')[0]
+    if ev.p1_odds is not None and ev.p2_odds is not None:
+        o1, o2 = ev.p1_odds, ev.p2_odds
+    else:
+        o1, o2 = model_odds(r1, r2)
+    score = 0.0
+    factors = []
+    
+    rd = r1 - r2
+    if abs(rd) > 10:
+        score += (rd / 50) * 4.0
+        if abs(rd) > 100:
+            factors.append(f'Большое преимущество в рейтинге ({abs(rd)} очков)')
+        elif abs(rd) > 50:
+            factors.append(f'Преимущество в рейтинге ({abs(rd)} очков)')
+    
+    wd = wr1 - wr2
+    if abs(wd) > 1:
+        score += (wd / 10) * 3.5
+        if abs(wd) > 5:
+            leader = first1 if wd > 0 else first2
+            factors.append(f'Высокий винрейт {leader} ({max(wr1, wr2)}%)')
+    
+    if abs(f1 - f2) >= 1:
+        score += ((f1 - f2) * 0.5) * 2.8
+        if f1 >= 4:
+            factors.append(f'{first1} в отличной форме ({f1}/5 побед)')
+        elif f2 >= 4:
+            factors.append(f'{first2} в отличной форме ({f2}/5 побед)')
+        elif f1 <= 1:
+            factors.append(f'{first1} в слабой форме ({f1}/5 побед)')
+        elif f2 <= 1:
+            factors.append(f'{first2} в слабой форме ({f2}/5 побед)')
+    
+    odds_diff = o1 - o2
+    if abs(odds_diff) > 0.5:
+        score += (-1 if odds_diff > 0 else 1) * 1.2
+        favorite = first1 if odds_diff < 0 else first2
+        favorite_odds = min(o1, o2)
+        if favorite_odds < 1.5:
+            factors.append(f'{favorite} явный фаворит (коэф. {favorite_odds})')
+    
+    s1, s2 = ev.home_score or 0, ev.away_score or 0
+    if ev.status == 'LIVE' and (s1 or s2):
+        d = s1 - s2
+        if d != 0:
+            score += d * 1.2 * 5.0
+            leader = first1 if d > 0 else first2
+            if abs(d) >= 2:
+                factors.append(f'{leader} доминирует ({s1}:{s2})')
+            else:
+                factors.append(f'{leader} лидирует ({s1}:{s2})')
+    
+    conf = max(48, min(96, js_round(50 + abs(score) * 4.5)))
+    
+    bet_type = 'skip'
+    if conf >= 78:
+        bet_type = 'strong'
+    elif conf >= 67:
+        bet_type = 'medium'
+    elif conf >= 56:
+        bet_type = 'risky'
+    
+    if not factors:
+        factors.append('Игроки примерно равны по силам')
+    
+    return {
+        'winner': 'p1' if score >= 0 else 'p2',
+        'confidence': conf,
+        'factors': factors[:4],
+        'betType': bet_type
+    }
+
+
+def normalize_name(name):
+    """Нормализация имени игрока: транслитерация, без регистра, пунктуации и лишних пробелов"""
+    text = str(name).lower().translate(TRANSLIT)
+    text = re.sub(r'[^a-z0-9]+', ' ', text)
+    return ' '.join(text.split())
+
+
+def name_keys(name):
+    """Точные ключи алиасов: нормализованное имя и перестановка частей"""
+    norm = normalize_name(name)
+    parts = norm.split()
+    if len(parts) < 2:
+        return [norm] if norm else []
+    return list(dict.fromkeys([norm, f'{parts[-1]} {parts[0]}']))
+
+
+def is_short_form(key):
+    return any(len(part) == 1 for part in key.split())
+
+
+def short_keys(name):
+    """Формы «Фамилия И.» полного имени для обоих порядков; у короткого имени их нет"""
+    parts = normalize_name(name).split()
+    if len(parts) < 2 or is_short_form(' '.join(parts)):
+        return []
+    first, last = parts[0], parts[-1]
+    return list(dict.fromkeys([f'{first} {last[0]}', f'{last} {first[0]}']))
+
+
+def short_alias_key(key, player_id):
+    """Короткие формы живут в отдельном пространстве ключей, по строке на каждого игрока:
+    «ivanov i» может принадлежать и Ivanov Ivan, и Ivanov Igor"""
+    return f'~{key}#{player_id}'
+
+
+def short_candidates(keys):
+    """Игроки, чьи короткие формы совпадают с коротким именем"""
+    return {pid for k in keys for pid in short_index.get(k, ())}
+
+
+def load_player_index():
+    """Хэш-индекс алиас → player_id в памяти, обновляется раз в PLAYER_INDEX_TTL_SECONDS"""
+    global player_index, short_index, player_index_loaded_at
+    
+    if time.time() - player_index_loaded_at < PLAYER_INDEX_TTL_SECONDS:
+        return True
+    
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return False
+    
+    try:
+        conn = psycopg2.connect(db_url, connect_timeout=3)
+        cur = conn.cursor()
+        cur.execute("SELECT alias_key, player_id FROM player_aliases")
+        index = {}
+        shorts = {}
+        for alias_key, player_id in cur.fetchall():
+            if alias_key.startswith('~'):
+                shorts.setdefault(alias_key[1:].rsplit('#', 1)[0], set()).add(player_id)
+            else:
+                index[alias_key] = player_id
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f'Player index load error: {str(e)}')
+        return bool(player_index)
+    
+    with player_index_lock:
+        player_index = index
+        short_index = shorts
+        player_index_loaded_at = time.time()
+    print(f'Player index loaded: {len(index)} aliases')
+    return True
+
+
+def lookup_player(name, source, source_id):
+    """O(1)-поиск: сначала id источника; короткое имя — только если ему соответствует ровно
+    один игрок; затем точное имя или перестановка"""
+    if source and source_id not in ('', None, name):
+        player_id = player_index.get(f'#{source}:{source_id}')
+        if player_id:
+            return player_id
+    
+    keys = name_keys(name)
+    if not keys:
+        return None
+    
+    if is_short_form(keys[0]):
+        candidates = short_candidates(keys)
+        if len(candidates) == 1:
+            return candidates.pop()
+        if candidates:
+            return None
+    
+    for key in keys:
+        player_id = player_index.get(key)
+        if player_id:
+            return player_id
+    return None
+
+
+def resolve_players(events):
+    """Проставление канонических playerId; новые игроки и алиасы пишутся в БД одной пачкой"""
+    if not load_player_index():
+        return
+    
+    pending = {}
+    for ev in events:
+        for side in ('home', 'away'):
+            name = getattr(ev, f'{side}_name')
+            source_id = getattr(ev, f'{side}_id')
+            player_id = lookup_player(name, ev.source, source_id)
+            if player_id:
+                setattr(ev, f'{side}_player_id', player_id)
+                continue
+            keys = name_keys(name)
+            # Неоднозначное короткое имя не заводим отдельным игроком — playerId остаётся пустым
+            if keys and not (is_short_form(keys[0]) and short_candidates(keys)):
+                pending.setdefault(keys[0], []).append((ev, side, name, source_id))
+    
+    if pending:
+        register_players(pending)
+
+
+def register_players(pending):
+    db_url = os.environ.get('DATABASE_URL', '')
+    try:
+        conn = psycopg2.connect(db_url, connect_timeout=3)
+        cur = conn.cursor()
+        normalized = list(pending.keys())
+        rows = psycopg2.extras.execute_values(cur, """
+            INSERT INTO players (canonical_name, normalized_name)
+            VALUES %s
+            ON CONFLICT (normalized_name) DO UPDATE SET normalized_name = EXCLUDED.normalized_name
+            RETURNING id, normalized_name
+        """, [(pending[k][0][2], k) for k in normalized], fetch=True)
+        ids = {row[1]: row[0] for row in rows}
+        
+        aliases = []
+        for key, refs in pending.items():
+            player_id = ids[key]
+            for ev, side, name, source_id in refs:
+                setattr(ev, f'{side}_player_id', player_id)
+                for alias in name_keys(name):
+                    aliases.append((alias, player_id, name[:100], ev.source or None, None))
+                for alias in short_keys(name):
+                    aliases.append((short_alias_key(alias, player_id), player_id, name[:100], ev.source or None, None))
+                if ev.source and source_id not in ('', None, name):
+                    aliases.append((f'#{ev.source}:{source_id}', player_id, name[:100], ev.source, str(source_id)))
+        
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO player_aliases (alias_key, player_id, alias, source, source_player_id)
+            VALUES %s
+            ON CONFLICT (alias_key) DO NOTHING
+        """, list({a[0]: a for a in aliases}.values()))
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f'Player register error: {str(e)}')
+        return
+    
+    with player_index_lock:
+        for alias in aliases:
+            if alias[0].startswith('~'):
+                short_index.setdefault(alias[0][1:].rsplit('#', 1)[0], set()).add(alias[1])
+            else:
+                player_index.setdefault(alias[0], alias[1])
+    print(f'Registered players: {len(pending)}')
+
+
+def event_status(ev):
+    """Нормализованный статус события: live / scheduled / finished"""
+    if ev.status == 'LIVE':
+        return 'live'
+    if ev.status == 'FT':
+        return 'finished'
+    return 'scheduled'
+
+
+def event_matches_filter(ev, league, status):
+    if status and event_status(ev) != status:
+        return False
+    if league and league.lower() not in ev.league.lower():
+        return False
+    return True
+
+
+def save_snapshot(events, fragments, source):
+    """Запись нормализованных событий в таблицу events (фоном, после сбора)"""
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return
+    
+    rows = []
+    for ev, fragment in zip(events, fragments):
+        if ev.id == '' or ev.id is None:
+            continue
+        # Ключ по источнику события, а не по метке сбора: при фолбэке строки не дублируются
+        ev_source = ev.source or source
+        rows.append((
+            f'{ev_source}:{ev.id}', ev_source, ev.league[:200], event_status(ev),
+            ev.date, fragment
+        ))
+    if not rows:
+        return
+    
+    try:
+        conn = psycopg2.connect(db_url, connect_timeout=3)
+        cur = conn.cursor()
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO events (id, source, league, status, start_time, payload)
+            VALUES %s
+            ON CONFLICT (id) DO UPDATE SET
+                league = EXCLUDED.league,
+                status = EXCLUDED.status,
+                start_time = EXCLUDED.start_time,
+                payload = EXCLUDED.payload,
+                updated_at = NOW()
+        """, rows, template='(%s, %s, %s, %s, %s, %s::jsonb)')
+        cur.execute(
+            "DELETE FROM events WHERE start_time < NOW() - %s * INTERVAL '1 day'",
+            (SNAPSHOT_RETENTION_DAYS,)
+        )
+        conn.commit()
+        cur.close()
+        conn.close()
+        print(f'Snapshot saved: {len(rows)} events')
+    except Exception as e:
+        print(f'Snapshot save error: {str(e)}')
+
+
+def snapshot_response(league, status):
+    """Ответ из последнего сохранённого снапшота таблицы events"""
+    fragments = []
+    snapshot_at = None
+    
+    db_url = os.environ.get('DATABASE_URL', '')
+    if db_url:
+        try:
+            conn = psycopg2.connect(db_url, connect_timeout=3)
+            cur = conn.cursor()
+            # Пропавшие из ленты матчи не обновляются: live старше порога и scheduled,
+            # отсутствующие в последнем сборе своего источника, не отдаются
+            query = """
+                SELECT payload::text, updated_at FROM events
+                WHERE start_time >= NOW() - INTERVAL '1 day'
+                  AND (
+                      status = 'finished'
+                      OR (status = 'live' AND updated_at >= NOW() - %s * INTERVAL '1 second')
+                      OR (status = 'scheduled' AND updated_at >= (
+                          SELECT MAX(latest.updated_at) FROM events latest WHERE latest.source = events.source
+                      ) - %s * INTERVAL '1 second')
+                  )
+            """
+            args = [SNAPSHOT_LIVE_MAX_AGE_SECONDS, SNAPSHOT_MISSING_GRACE_SECONDS]
+            if status:
+                query += " AND status = %s"
+                args.append(status)
+            if league:
+                query += " AND league ILIKE %s"
+                args.append(f'%{league}%')
+            query += " ORDER BY start_time LIMIT %s"
+            args.append(SNAPSHOT_LIMIT)
+            cur.execute(query, args)
+            for row in cur.fetchall():
+                fragments.append(row[0])
+                if snapshot_at is None or row[1] > snapshot_at:
+                    snapshot_at = row[1]
+            cur.close()
+            conn.close()
+        except Exception as e:
+            print(f'Snapshot read error: {str(e)}')
+    
+    print(f'Snapshot: {len(fragments)} events')
+    
+    return {
+        'statusCode': 200,
+        'headers': CORS_HEADERS,
+        'body': render_body(fragments, {
+            'total': len(fragments),
+            'source': 'snapshot',
+            'stale': True,
+            'sources': breakers_snapshot(),
+            'snapshotAt': snapshot_at.isoformat() if snapshot_at else None,
+            'updatedAt': datetime.now(timezone.utc).isoformat()
+        })
+    }
+
+
+def load_breakers():
+    """Загрузка состояния circuit breaker'ов из БД (один раз на холодный старт)"""
+    global source_breakers_loaded
+    
+    if source_breakers_loaded:
+        return
+    source_breakers_loaded = True
+    
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return
+    
+    try:
+        conn = psycopg2.connect(db_url, connect_timeout=3)
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT source, state, failures, cooldown_seconds,
+                   EXTRACT(EPOCH FROM opened_until)
+            FROM source_health
+        """)
+        with breakers_lock:
+            for row in cur.fetchall():
+                br = get_breaker(row[0])
+                br['state'] = row[1]
+                br['failures'] = row[2] or 0
+                br['cooldown'] = row[3] or BREAKER_BASE_COOLDOWN
+                br['openedUntil'] = float(row[4] or 0)
+                if br['state'] == 'half-open':
+                    br['state'] = 'open'
+        cur.close()
+        conn.close()
+        print(f'Source health loaded: {len(source_breakers)} sources')
+    except Exception as e:
+        print(f'Source health load error: {str(e)}')
+
+
+def persist_breaker(source):
+    """Сохранение состояния источника в БД, чтобы его видели другие инстансы"""
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return
+    
+    br = get_breaker(source)
+    try:
+        conn = psycopg2.connect(db_url, connect_timeout=3)
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO source_health (
+                source, state, failures, cooldown_seconds, opened_until, last_error
+            ) VALUES (%s, %s, %s, %s, to_timestamp(%s), %s)
+            ON CONFLICT (source) DO UPDATE SET
+                state = EXCLUDED.state,
+                failures = EXCLUDED.failures,
+                cooldown_seconds = EXCLUDED.cooldown_seconds,
+                opened_until = EXCLUDED.opened_until,
+                last_error = EXCLUDED.last_error,
+                updated_at = NOW()
+        """, (
+            source, br['state'], br['failures'], br['cooldown'],
+            br['openedUntil'], (br['lastError'] or '')[:300]
+        ))
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f'Source health save error: {str(e)}')
+
+
+def get_breaker(source):
+    br = source_breakers.get(source)
+    if br is None:
+        br = {
+            'state': 'closed',
+            'failures': 0,
+            'cooldown': BREAKER_BASE_COOLDOWN,
+            'openedUntil': 0.0,
+            'probeStartedAt': 0.0,
+            'latencyMs': None,
+            'lastError': None
+        }
+        source_breakers[source] = br
+    return br
+
+
+def breaker_allows(source):
+    """closed — запрос идёт; open — пропуск до конца cooldown; затем один пробный запрос (half-open)"""
+    now = time.time()
+    with breakers_lock:
+        br = get_breaker(source)
+        if br['state'] == 'closed':
+            return True
+        if br['state'] == 'open':
+            if now < br['openedUntil']:
+                return False
+            br['state'] = 'half-open'
+            br['probeStartedAt'] = 0.0
+        if br['probeStartedAt'] and now - br['probeStartedAt'] < BREAKER_PROBE_TIMEOUT:
+            return False
+        br['probeStartedAt'] = now
+        print(f'◐ {source}: half-open, пробный запрос')
+        return True
+
+
+def breaker_closed(source):
+    """Фоновые загрузки идут только при закрытом breaker и не занимают слот пробного запроса"""
+    with breakers_lock:
+        return get_breaker(source)['state'] == 'closed'
+
+
+def record_success(source, elapsed):
+    with breakers_lock:
+        br = get_breaker(source)
+        latency = elapsed * 1000
+        br['latencyMs'] = latency if br['latencyMs'] is None else br['latencyMs'] * 0.7 + latency * 0.3
+        changed = br['state'] != 'closed' or br['failures'] > 0
+        br['state'] = 'closed'
+        br['failures'] = 0
+        br['cooldown'] = BREAKER_BASE_COOLDOWN
+        br['openedUntil'] = 0.0
+        br['probeStartedAt'] = 0.0
+        br['lastError'] = None
+    if changed:
+        print(f'● {source}: circuit closed')
+        persist_breaker(source)
+
+
+def record_failure(source, error):
+    now = time.time()
+    with breakers_lock:
+        br = get_breaker(source)
+        br['failures'] += 1
+        br['lastError'] = error
+        br['probeStartedAt'] = 0.0
+        if br['state'] == 'half-open':
+            br['cooldown'] = min(br['cooldown'] * 2, BREAKER_MAX_COOLDOWN)
+            br['state'] = 'open'
+        elif br['failures'] >= BREAKER_FAILURE_THRESHOLD:
+            br['state'] = 'open'
+        if br['state'] == 'open':
+            br['openedUntil'] = now + br['cooldown']
+            print(f'○ {source}: circuit open на {br["cooldown"]} с ({error})')
+    persist_breaker(source)
+
+
+def call_source(source, fn, *args):
+    """Вызов источника через circuit breaker. None — источник пропущен или упал"""
+    if not breaker_allows(source):
+        print(f'⏭ {source}: circuit open, пропуск')
+        return None
+    
+    started = time.time()
+    try:
+        result = fn(*args)
+    except StaleSourceError as e:
+        print(f'{source} error: {str(e)}, отдаём кэш ({len(e.events)})')
+        record_failure(source, str(e))
+        return e.events
+    except Exception as e:
+        print(f'{source} error: {str(e)}')
+        record_failure(source, str(e))
+        return None
+    
+    record_success(source, time.time() - started)
+    return result
+
+
+def breakers_snapshot():
+    now = time.time()
+    with breakers_lock:
+        return [
+            {
+                'source': source,
+                'state': br['state'],
+                'failures': br['failures'],
+                'retryIn': max(0, round(br['openedUntil'] - now)) if br['state'] == 'open' else 0,
+                'latencyMs': round(br['latencyMs']) if br['latencyMs'] is not None else None
+            }
+            for source, br in source_breakers.items()
+        ]
+
+
+def schedule_days():
+    """Даты (UTC), для которых держим расписание: сегодня и ещё SCHEDULE_DAYS - 1 дней вперёд"""
+    now = datetime.now(timezone.utc)
+    return [(now + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(SCHEDULE_DAYS)]
+
+
+def get_live(source, fetch_fn, fetch_log, refresh=LIVE_REFRESH_SECONDS):
+    """Live-список с быстрым циклом обновления (LIVE_REFRESH_SECONDS или интервал по квоте)"""
+    entry = live_store.get(source)
+    if entry and time.time() - entry['fetchedAt'] < refresh:
+        return entry['events']
+    if refresh == QUOTA_BLOCKED:
+        return []
+    
+    try:
+        events = fetch_fn()
+    except Exception as e:
+        print(f'{source} live error: {str(e)}')
+        fetch_log.append(False)
+        return entry['events'] if entry else []
+    
+    fetch_log.append(True)
+    live_store[source] = {'events': events, 'fetchedAt': time.time()}
+    return events
+
+
+def get_schedule(source, day, fetch_fn, fetch_log, refresh=SCHEDULE_REFRESH_SECONDS):
+    """Расписание на день: память → БД → upstream, с медленным циклом (SCHEDULE_REFRESH_SECONDS)"""
+    key = (source, day)
+    entry = schedule_store.get(key)
+    if entry and time.time() - entry['fetchedAt'] < refresh:
+        return entry['events']
+    
+    stored = load_schedule(source, day)
+    if stored and time.time() - stored['fetchedAt'] < refresh:
+        with schedule_lock:
+            schedule_store[key] = stored
+        return stored['events']
+    entry = stored or entry
+    if refresh == QUOTA_BLOCKED:
+        return entry['events'] if entry else []
+    
+    try:
+        events = fetch_fn(day)
+    except Exception as e:
+        print(f'{source} schedule {day} error: {str(e)}')
+        fetch_log.append(False)
+        return entry['events'] if entry else []
+    
+    fetch_log.append(True)
+    entry = {'events': events, 'fetchedAt': time.time()}
+    with schedule_lock:
+        schedule_store[key] = entry
+    save_schedule(source, day, entry)
+    return events
+
+
+def seconds_to_midnight():
+    now = datetime.now(timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+def warm_schedule(source, fetch_fn, refresh=SCHEDULE_REFRESH_SECONDS):
+    """Фоновый параллельный прогрев расписания на следующие дни окна.
+    
+    За SCHEDULE_ROLLOVER_WARMUP_SECONDS до полуночи UTC завтрашний день обновляется
+    чаще, чтобы после смены даты он был свежим и первый запрос дня не ждал upstream.
+    Ускорение пропускается, если quota_intervals уже растянул интервал ради квоты.
+    """
+    rollover = seconds_to_midnight() < SCHEDULE_ROLLOVER_WARMUP_SECONDS
+    for i, day in enumerate(schedule_days()[1:]):
+        day_refresh = refresh
+        if i == 0 and rollover and refresh <= SCHEDULE_REFRESH_SECONDS:
+            day_refresh = SCHEDULE_ROLLOVER_REFRESH_SECONDS
+        prefetch_schedule(source, day, fetch_fn, day_refresh)
+    
+    today = schedule_days()[0]
+    with schedule_lock:
+        for key in [k for k in list(schedule_store) if k[0] == source and k[1] < today]:
+            del schedule_store[key]
+
+
+def prefetch_schedule(source, day, fetch_fn, refresh):
+    """Загрузка дня расписания в prefetch_executor; не больше одной задачи на (источник, день).
+    Исход загрузки сама задача записывает в breaker источника."""
+    if not breaker_closed(source):
+        return None
+    
+    key = (source, day)
+    entry = schedule_store.get(key)
+    if entry and time.time() - entry['fetchedAt'] < refresh:
+        return None
+    
+    with prefetch_lock:
+        if key in prefetch_inflight:
+            return None
+        prefetch_inflight.add(key)
+    
+    def run():
+        fetch_log = []
+        started = time.time()
+        try:
+            return get_schedule(source, day, fetch_fn, fetch_log, refresh)
+        finally:
+            if fetch_log and all(fetch_log):
+                record_success(source, time.time() - started)
+            elif fetch_log:
+                record_failure(source, f'schedule {day} prefetch failed')
+            with prefetch_lock:
+                prefetch_inflight.discard(key)
+    
+    return prefetch_executor.submit(run)
+
+
+def schedule_range_response(api_key, date_from, date_to, league, status):
+    """Матчи за диапазон дат ?from=&to= из предзагруженного расписания"""
+    try:
+        start = datetime.strptime(date_from or date_to, '%Y-%m-%d')
+        end = datetime.strptime(date_to or date_from, '%Y-%m-%d')
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'error': 'from/to должны быть в формате YYYY-MM-DD'}, ensure_ascii=False)
+        }
+    
+    span = (end - start).days + 1
+    if span < 1 or span > SCHEDULE_MAX_RANGE_DAYS:
+        return {
+            'statusCode': 400,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'error': f'Диапазон должен быть от 1 до {SCHEDULE_MAX_RANGE_DAYS} дней'}, ensure_ascii=False)
+        }
+    
+    days = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(span)]
+    window = set(schedule_days())
+    
+    if api_key and breaker_closed('api-football'):
+        source = 'api-football'
+        fetch_fn = functools.partial(fetch_apifootball_day, api_key)
+        is_liga_pro = is_liga_pro_apifootball
+        load_quota()
+        refresh = quota_intervals()[1]
+    else:
+        source = 'sofascore'
+        fetch_fn = fetch_sofascore_day
+        is_liga_pro = is_liga_pro_scraped
+        refresh = SCHEDULE_REFRESH_SECONDS
+    
+    # Дни окна догружаются параллельно (если breaker источника закрыт),
+    # остальные и всё при открытом breaker — только из памяти или schedule_cache
+    futures = [prefetch_schedule(source, day, fetch_fn, refresh) for day in days if day in window]
+    futures = [f for f in futures if f is not None]
+    if futures:
+        futures_wait(futures, timeout=MATCHES_DEADLINE_SECONDS)
+    
+    scheduled = []
+    for day in days:
+        entry = schedule_store.get((source, day)) or load_schedule(source, day)
+        if entry:
+            scheduled.extend(entry['events'])
+    
+    live = live_store.get(source)
+    if live and schedule_days()[0] in days:
+        events = merge_events(scheduled, live['events'])
+    else:
+        events = scheduled
+    
+    events = [ev for ev in events if is_liga_pro(ev)]
+    events.sort(key=lambda ev: ev.date or '')
+    resolve_players(events)
+    fragments = [
+        fragment for ev, fragment in zip(events, render_fragments(events))
+        if event_matches_filter(ev, league, status)
+    ]
+    print(f'Schedule range {days[0]}..{days[-1]} ({source}): {len(fragments)} events')
+    
+    return {
+        'statusCode': 200,
+        'headers': CORS_HEADERS,
+        'body': render_body(fragments, {
+            'total': len(fragments),
+            'source': source,
+            'from': days[0],
+            'to': days[-1],
+            'updatedAt': datetime.now(timezone.utc).isoformat()
+        })
+    }
+
+
+def load_schedule(source, day):
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return None
+    
+    try:
+        conn = psycopg2.connect(db_url, connect_timeout=3)
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT payload, EXTRACT(EPOCH FROM fetched_at)
+            FROM schedule_cache
+            WHERE source = %s AND day = %s
+        """, (source, day))
+        row = cur.fetchone()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f'Schedule cache load error: {str(e)}')
+        return None
+    
+    if not row:
+        return None
+    return {'events': [Event.from_wire(d, source) for d in row[0]], 'fetchedAt': float(row[1])}
+
+
+def save_schedule(source, day, entry):
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return
+    
+    try:
+        conn = psycopg2.connect(db_url, connect_timeout=3)
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO schedule_cache (source, day, payload, fetched_at)
+            VALUES (%s, %s, %s::jsonb, to_timestamp(%s))
+            ON CONFLICT (source, day) DO UPDATE SET
+                payload = EXCLUDED.payload,
+                fetched_at = EXCLUDED.fetched_at
+        """, (source, day, '[' + ','.join(ev.to_json() for ev in entry['events']) + ']', entry['fetchedAt']))
+        cur.execute("DELETE FROM schedule_cache WHERE day < CURRENT_DATE - 1")
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f'Schedule cache save error: {str(e)}')
+
+
+def merge_events(scheduled, live):
+    """Live-события поверх расписания: одна запись на id, live-версия приоритетнее"""
+    merged = {}
+    for ev in scheduled:
+        merged[ev.id] = ev
+    for ev in live:
+        merged[ev.id] = ev
+    return list(merged.values())
+
+
+def handle_paid_api(api_key):
+    """Платный API — API-Football (Table Tennis) через RapidAPI"""
+    fetch_log = []
+    started = time.time()
+    
+    def fetch_live():
+        data = fetch_apifootball(api_key, '/games', {'live': 'all', 'timezone': 'Europe/Moscow'})
+        if not data or 'response' not in data:
+            raise RuntimeError('API-Football live request failed')
+        now_iso = datetime.now(timezone.utc).isoformat()
+        return [ev for ev in (convert_apifootball_event(raw, now_iso) for raw in data['response']) if ev]
+    
+    fetch_day = functools.partial(fetch_apifootball_day, api_key)
+    
+    load_quota()
+    live_every, schedule_every = quota_intervals()
+    print(f'API-Football quota: remaining={api_quota["remaining"]}, live every {live_every}s, schedule every {schedule_every}s')
+    
+    live_events = get_live('api-football', fetch_live, fetch_log, live_every)
+    print(f'API-Football live: {len(live_events)} events')
+    
+    scheduled = []
+    for day in schedule_days()[:1]:
+        day_events = get_schedule('api-football', day, fetch_day, fetch_log, schedule_every)
+        scheduled.extend(day_events)
+        print(f'API-Football scheduled {day}: {len(day_events)} events')
+    warm_schedule('api-football', fetch_day, schedule_every)
+    
+    if fetch_log and not any(fetch_log):
+        record_failure('api-football', 'all requests failed')
+    elif fetch_log:
+        record_success('api-football', time.time() - started)
+    
+    if not live_events and not scheduled:
+        return handle_free_scraping()
+    
+    all_events = merge_events(scheduled, live_events)
+    print(f'Total events from API: {len(all_events)}')
+    
+    filtered = [ev for ev in all_events if is_liga_pro_apifootball(ev)]
+    print(f'Filtered Liga Pro: {len(filtered)} events')
+    
+    return filtered, 'api-football'
+
+
+def fetch_apifootball_day(api_key, day):
+    data = fetch_apifootball(api_key, '/games', {'date': day, 'timezone': 'Europe/Moscow'})
+    if not data or 'response' not in data:
+        raise RuntimeError(f'API-Football schedule {day} request failed')
+    now_iso = datetime.now(timezone.utc).isoformat()
+    return [ev for ev in (convert_apifootball_event(raw, now_iso) for raw in data['response']) if ev]
+
+
+def load_quota():
+    """Счётчики квоты RapidAPI из БД — общие для всех инстансов"""
+    if time.time() - api_quota['syncedAt'] < QUOTA_SYNC_SECONDS:
+        return
+    api_quota['syncedAt'] = time.time()
+    
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return
+    
+    try:
+        conn = psycopg2.connect(db_url, connect_timeout=3)
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT remaining, request_limit, EXTRACT(EPOCH FROM reset_at), EXTRACT(EPOCH FROM updated_at)
+            FROM api_quota
+            WHERE provider = 'api-football'
+        """)
+        row = cur.fetchone()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f'Quota load error: {str(e)}')
+        return
+    
+    if row and float(row[3]) > api_quota['updatedAt']:
+        with quota_lock:
+            api_quota['remaining'] = row[0]
+            api_quota['limit'] = row[1]
+            api_quota['resetAt'] = float(row[2] or 0)
+            api_quota['updatedAt'] = float(row[3])
+
+
+def record_quota(headers, exhausted=False):
+    """Обновление остатка квоты по заголовкам x-ratelimit-requests-* ответа RapidAPI"""
+    remaining = headers.get('x-ratelimit-requests-remaining')
+    limit = headers.get('x-ratelimit-requests-limit')
+    reset = headers.get('x-ratelimit-requests-reset') or headers.get('retry-after')
+    
+    with quota_lock:
+        now = time.time()
+        if remaining is not None and str(remaining).isdigit():
+            api_quota['remaining'] = int(remaining)
+        elif exhausted:
+            api_quota['remaining'] = 0
+        elif api_quota['remaining'] is not None:
+            api_quota['remaining'] = max(0, api_quota['remaining'] - 1)
+        if limit is not None and str(limit).isdigit():
+            api_quota['limit'] = int(limit)
+        if reset is not None and str(reset).isdigit():
+            api_quota['resetAt'] = now + int(reset)
+        api_quota['updatedAt'] = now
+        snapshot = dict(api_quota)
+    
+    if snapshot['remaining'] is None:
+        return
+    
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return
+    
+    try:
+        conn = psycopg2.connect(db_url, connect_timeout=3)
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO api_quota (provider, remaining, request_limit, reset_at, updated_at)
+            VALUES ('api-football', %s, %s, to_timestamp(%s), to_timestamp(%s))
+            ON CONFLICT (provider) DO UPDATE SET
+                remaining = EXCLUDED.remaining,
+                request_limit = EXCLUDED.request_limit,
+                reset_at = EXCLUDED.reset_at,
+                updated_at = EXCLUDED.updated_at
+        """, (snapshot['remaining'], snapshot['limit'], snapshot['resetAt'], snapshot['updatedAt']))
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f'Quota save error: {str(e)}')
+
+
+def quota_intervals():
+    """Интервалы обновления live и расписания, растянутые так, чтобы остаток квоты дожил до сброса.
+    Live в приоритете: расписанию достаётся не больше QUOTA_SCHEDULE_SHARE бюджета."""
+    with quota_lock:
+        remaining = api_quota['remaining']
+        reset_at = api_quota['resetAt']
+        reset_in = reset_at - time.time()
+    
+    if remaining is None or (reset_at and reset_in <= 0):
+        return LIVE_REFRESH_SECONDS, SCHEDULE_REFRESH_SECONDS
+    
+    budget = remaining - QUOTA_SAFETY_REQUESTS
+    if not reset_at:
+        if budget <= 0:
+            return QUOTA_BLOCKED, QUOTA_PROBE_SECONDS
+        reset_in = QUOTA_ASSUMED_RESET_SECONDS
+    elif budget <= 0:
+        return QUOTA_BLOCKED, QUOTA_BLOCKED
+    
+    schedule_budget = max(1.0, budget * QUOTA_SCHEDULE_SHARE)
+    schedule_every = max(SCHEDULE_REFRESH_SECONDS, reset_in * SCHEDULE_DAYS / schedule_budget)
+    schedule_cost = min(schedule_budget, reset_in * SCHEDULE_DAYS / schedule_every)
+    
+    live_budget = budget - schedule_cost
+    if live_budget < 1:
+        return QUOTA_BLOCKED, round(schedule_every)
+    live_every = max(LIVE_REFRESH_SECONDS, reset_in / live_budget)
+    
+    return round(live_every), round(schedule_every)
+
+
 def handle_free_scraping():
     """Парсинг Liga Stavok с авторизацией"""
     all_events = []
@@ -79,42 +1485,27 @@ def handle_free_scraping():
     password = os.environ.get('LIGA_STAVOK_PASSWORD', '')
     
     if login and password:
-        try:
-            liga_data = scrape_liga_stavok_auth(login, password)
+        liga_data = call_source('liga-stavok', scrape_liga_stavok_auth, login, password)
+        if liga_data is not None:
             all_events.extend(liga_data)
             print(f'Liga Stavok: {len(liga_data)} events')
-        except Exception as e:
-            print(f'Liga Stavok error: {str(e)}')
     
-    try:
-        flashscore_data = scrape_flashscore()
+    flashscore_data = call_source('flashscore', scrape_flashscore)
+    if flashscore_data is not None:
         all_events.extend(flashscore_data)
         print(f'Flashscore: {len(flashscore_data)} events')
-    except Exception as e:
-        print(f'Flashscore error: {str(e)}')
     
-    try:
-        sofascore_data = scrape_sofascore()
+    sofascore_data = call_source('sofascore', scrape_sofascore)
+    if sofascore_data is not None:
         all_events.extend(sofascore_data)
         print(f'SofaScore: {len(sofascore_data)} events')
-    except Exception as e:
-        print(f'SofaScore error: {str(e)}')
     
     filtered = [ev for ev in all_events if is_liga_pro_scraped(ev)]
     print(f'Filtered Liga Pro: {len(filtered)} events')
     
     source = 'liga-stavok' if login and password else 'flashscore-sofascore'
     
-    return {
-        'statusCode': 200,
-        'headers': CORS_HEADERS,
-        'body': json.dumps({
-            'events': filtered,
-            'total': len(filtered),
-            'source': source,
-            'updatedAt': datetime.now(timezone.utc).isoformat()
-        }, ensure_ascii=False)
-    }
+    return filtered, source
 
 
 def scrape_liga_stavok_auth(login, password):
@@ -127,6 +1518,8 @@ def scrape_liga_stavok_auth(login, password):
     
     print(f'Liga Stavok: попытка парсинга публичных данных')
     
+    errors = []
+    
     try:
         headers = {
             'User-Agent': UA,
@@ -148,14 +1541,16 @@ def scrape_liga_stavok_auth(login, password):
             data = json.loads(resp.read().decode('utf-8'))
             
             if isinstance(data, dict) and 'data' in data:
+                now_iso = datetime.now(timezone.utc).isoformat()
                 for game in data['data'].get('games', []):
-                    ev = convert_ligastavok_event(game, 'LIVE')
+                    ev = convert_ligastavok_event(game, 'LIVE', now_iso)
                     if ev:
                         events.append(ev)
         
         print(f'✓ Liga Stavok live: {len(events)} матчей')
     except Exception as e:
         print(f'✗ Liga Stavok live error: {str(e)}')
+        errors.append(e)
     
     try:
         headers = {
@@ -178,19 +1573,24 @@ def scrape_liga_stavok_auth(login, password):
             data = json.loads(resp.read().decode('utf-8'))
             
             if isinstance(data, dict) and 'data' in data:
+                now_iso = datetime.now(timezone.utc).isoformat()
                 for game in data['data'].get('games', []):
-                    ev = convert_ligastavok_event(game, 'scheduled')
+                    ev = convert_ligastavok_event(game, 'scheduled', now_iso)
                     if ev:
                         events.append(ev)
         
         print(f'✓ Liga Stavok line: {len(events)} всего')
     except Exception as e:
         print(f'✗ Liga Stavok line error: {str(e)}')
+        errors.append(e)
+    
+    if len(errors) == 2:
+        raise errors[-1]
     
     return events
 
 
-def convert_ligastavok_event(game, status):
+def convert_ligastavok_event(game, status, now_iso):
     """Конвертация Liga Stavok события"""
     try:
         game_name = game.get('name', '')
@@ -214,38 +1614,50 @@ def convert_ligastavok_event(game, status):
         start_time = game.get('kickoff')
         
         if start_time:
-            dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+            date = datetime.fromisoformat(start_time.replace('Z', '+00:00')).isoformat()
         else:
-            dt = datetime.now(timezone.utc)
+            date = now_iso
         
-        return {
-            'id': f'ls_{game_id}',
-            'date': dt.isoformat(),
-            'status': status,
-            'league': {
-                'name': league_name,
-                'country': 'Russia'
-            },
-            'teams': {
-                'home': {
-                    'id': player1,
-                    'name': player1
-                },
-                'away': {
-                    'id': player2,
-                    'name': player2
-                }
-            },
-            'scores': {
-                'home': score1,
-                'away': score2
-            }
-        }
+        p1_odds, p2_odds = extract_ligastavok_odds(game)
+        
+        return Event(
+            f'ls_{game_id}', date, status, league_name, 'Russia',
+            player1, player1, player2, player2, score1, score2,
+            'liga-stavok', p1_odds=p1_odds, p2_odds=p2_odds
+        )
     except Exception as e:
         print(f'Error converting event: {str(e)}')
         return None
 
 
+def extract_ligastavok_odds(game):
+    """Коэффициенты П1/П2 Liga Stavok: список outcomes или плоский объект odds"""
+    outcomes = game.get('outcomes') or []
+    for market in game.get('markets') or []:
+        outcomes = outcomes or market.get('outcomes') or []
+    
+    odds = {}
+    for outcome in outcomes:
+        name = str(outcome.get('shortName') or outcome.get('name') or outcome.get('type') or '').upper()
+        value = outcome.get('value') or outcome.get('coef')
+        if name in ('П1', '1', 'W1', 'P1'):
+            odds['p1'] = value
+        elif name in ('П2', '2', 'W2', 'P2'):
+            odds['p2'] = value
+    
+    flat = game.get('odds') or {}
+    if isinstance(flat, dict):
+        odds.setdefault('p1', flat.get('p1') or flat.get('win1'))
+        odds.setdefault('p2', flat.get('p2') or flat.get('win2'))
+    
+    try:
+        if odds.get('p1') and odds.get('p2'):
+            return float(odds['p1']), float(odds['p2'])
+    except (TypeError, ValueError):
+        pass
+    return None, None
+
+
 def scrape_flashscore():
     """Парсинг Flashscore публичного виджета"""
     events = []
@@ -253,142 +1665,125 @@ def scrape_flashscore():
     ctx.check_hostname = False
     ctx.verify_mode = ssl.CERT_NONE
     
-    try:
-        url = 'https://www.flashscore.com/x/feed/df_st_1_ru_1'
-        headers = {
-            'User-Agent': UA,
-            'Accept': 'application/json, text/plain, */*',
-            'Referer': 'https://www.flashscore.com/',
-            'X-Fsign': 'SW9D1eZo'
-        }
+    url = 'https://www.flashscore.com/x/feed/df_st_1_ru_1'
+    headers = {
+        'User-Agent': UA,
+        'Accept': 'application/json, text/plain, */*',
+        'Referer': 'https://www.flashscore.com/',
+        'X-Fsign': 'SW9D1eZo'
+    }
+    
+    req = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(req, timeout=10, context=ctx) as resp:
+        text = resp.read().decode('utf-8')
+        now_iso = datetime.now(timezone.utc).isoformat()
         
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=10, context=ctx) as resp:
-            text = resp.read().decode('utf-8')
-            
-            lines = text.split('¬')
+        lines = text.split('¬')
+        
+        current_id = None
+        current_home = None
+        current_away = None
+        current_score_home = 0
+        current_score_away = 0
+        current_league = 'Table Tennis'
+        current_status = 'scheduled'
+        
+        for line in lines:
+            parts = line.split('÷')
+            if len(parts) < 2:
+                continue
             
-            current_id = None
-            current_home = None
-            current_away = None
-            current_score_home = 0
-            current_score_away = 0
-            current_league = 'Table Tennis'
-            current_status = 'scheduled'
+            key = parts[0]
+            value = parts[1] if len(parts) > 1 else ''
             
-            for line in lines:
-                parts = line.split('÷')
-                if len(parts) < 2:
-                    continue
-                
-                key = parts[0]
-                value = parts[1] if len(parts) > 1 else ''
-                
-                if key == 'AA':
-                    current_id = value
-                elif key == 'AE':
-                    current_home = value
-                elif key == 'AF':
-                    current_away = value
-                elif key == 'AG':
-                    current_score_home = int(value) if value.isdigit() else 0
-                elif key == 'AH':
-                    current_score_away = int(value) if value.isdigit() else 0
-                elif key == 'ZY':
-                    current_league = value
-                elif key == 'AB':
-                    if value == '1':
-                        current_status = 'LIVE'
-                    elif value == '100':
-                        current_status = 'FT'
-                    else:
-                        current_status = 'scheduled'
-                elif key == '~AA' and current_id and current_home and current_away:
-                    events.append({
-                        'id': f'fs_{current_id}',
-                        'date': datetime.now(timezone.utc).isoformat(),
-                        'status': current_status,
-                        'league': {
-                            'name': current_league,
-                            'country': 'International'
-                        },
-                        'teams': {
-                            'home': {
-                                'id': current_home,
-                                'name': current_home
-                            },
-                            'away': {
-                                'id': current_away,
-                                'name': current_away
-                            }
-                        },
-                        'scores': {
-                            'home': current_score_home,
-                            'away': current_score_away
-                        }
-                    })
-                    
-                    current_id = None
-                    current_home = None
-                    current_away = None
-                    current_score_home = 0
-                    current_score_away = 0
-                    current_league = 'Table Tennis'
+            if key == 'AA':
+                current_id = value
+            elif key == 'AE':
+                current_home = value
+            elif key == 'AF':
+                current_away = value
+            elif key == 'AG':
+                current_score_home = int(value) if value.isdigit() else 0
+            elif key == 'AH':
+                current_score_away = int(value) if value.isdigit() else 0
+            elif key == 'ZY':
+                current_league = value
+            elif key == 'AB':
+                if value == '1':
+                    current_status = 'LIVE'
+                elif value == '100':
+                    current_status = 'FT'
+                else:
                     current_status = 'scheduled'
-    except Exception as e:
-        print(f'Flashscore error: {str(e)}')
+            elif key == '~AA' and current_id and current_home and current_away:
+                events.append(Event(
+                    f'fs_{current_id}', now_iso, current_status, current_league, 'International',
+                    current_home, current_home, current_away, current_away,
+                    current_score_home, current_score_away,
+                    'flashscore'
+                ))
+                
+                current_id = None
+                current_home = None
+                current_away = None
+                current_score_home = 0
+                current_score_away = 0
+                current_league = 'Table Tennis'
+                current_status = 'scheduled'
     
     return events
 
 
 def scrape_sofascore():
     """Парсинг SofaScore Widget (публичный endpoint)"""
-    events = []
+    fetch_log = []
+    
+    live = get_live('sofascore', fetch_sofascore_live, fetch_log)
+    
+    scheduled = []
+    for day in schedule_days()[:1]:
+        scheduled.extend(get_schedule('sofascore', day, fetch_sofascore_day, fetch_log))
+    warm_schedule('sofascore', fetch_sofascore_day)
+    
+    events = merge_events(scheduled, live)
+    if fetch_log and not any(fetch_log):
+        if events:
+            raise StaleSourceError('SofaScore: все запросы завершились ошибкой', events)
+        raise RuntimeError('SofaScore: все запросы завершились ошибкой')
+    
+    return events
+
+
+def fetch_sofascore_json(url):
     ctx = ssl.create_default_context()
     ctx.check_hostname = False
     ctx.verify_mode = ssl.CERT_NONE
     
-    try:
-        url = 'https://www.sofascore.com/api/v1/sport/table-tennis/events/live'
-        headers = {
-            'User-Agent': UA,
-            'Accept': 'application/json',
-            'Referer': 'https://www.sofascore.com/',
-            'Origin': 'https://www.sofascore.com'
-        }
-        
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=10, context=ctx) as resp:
-            data = json.loads(resp.read().decode('utf-8'))
-            if 'events' in data:
-                for ev in data['events']:
-                    events.append(convert_sofascore_event(ev))
-    except Exception as e:
-        print(f'SofaScore API error: {str(e)}')
-    
-    try:
-        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
-        url = f'https://www.sofascore.com/api/v1/sport/table-tennis/scheduled-events/{today}'
-        headers = {
-            'User-Agent': UA,
-            'Accept': 'application/json',
-            'Referer': 'https://www.sofascore.com/',
-            'Origin': 'https://www.sofascore.com'
-        }
-        
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=10, context=ctx) as resp:
-            data = json.loads(resp.read().decode('utf-8'))
-            if 'events' in data:
-                for ev in data['events']:
-                    events.append(convert_sofascore_event(ev))
-    except Exception as e:
-        print(f'SofaScore scheduled error: {str(e)}')
+    headers = {
+        'User-Agent': UA,
+        'Accept': 'application/json',
+        'Referer': 'https://www.sofascore.com/',
+        'Origin': 'https://www.sofascore.com'
+    }
     
-    return events
+    req = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(req, timeout=10, context=ctx) as resp:
+        return json.loads(resp.read().decode('utf-8'))
+
+
+def fetch_sofascore_live():
+    data = fetch_sofascore_json('https://www.sofascore.com/api/v1/sport/table-tennis/events/live')
+    now_iso = datetime.now(timezone.utc).isoformat()
+    return [convert_sofascore_event(ev, now_iso) for ev in data.get('events', [])]
+
 
+def fetch_sofascore_day(day):
+    data = fetch_sofascore_json(f'https://www.sofascore.com/api/v1/sport/table-tennis/scheduled-events/{day}')
+    now_iso = datetime.now(timezone.utc).isoformat()
+    return [convert_sofascore_event(ev, now_iso) for ev in data.get('events', [])]
 
-def convert_sofascore_event(ev):
+
+def convert_sofascore_event(ev, now_iso):
     """Конвертация SofaScore события в универсальный формат"""
     home = ev.get('homeTeam', {})
     away = ev.get('awayTeam', {})
@@ -406,29 +1801,64 @@ def convert_sofascore_event(ev):
     home_score = ev.get('homeScore', {}).get('current', 0)
     away_score = ev.get('awayScore', {}).get('current', 0)
     
-    return {
-        'id': ev.get('id', ''),
-        'date': datetime.fromtimestamp(ev.get('startTimestamp', 0), tz=timezone.utc).isoformat() if ev.get('startTimestamp') else datetime.now(timezone.utc).isoformat(),
-        'status': status,
-        'league': {
-            'name': tournament.get('name', 'Table Tennis'),
-            'country': tournament.get('category', {}).get('name', 'International')
-        },
-        'teams': {
-            'home': {
-                'id': home.get('id', ''),
-                'name': home.get('name', 'Player 1')
-            },
-            'away': {
-                'id': away.get('id', ''),
-                'name': away.get('name', 'Player 2')
-            }
-        },
-        'scores': {
-            'home': home_score,
-            'away': away_score
-        }
-    }
+    sets = []
+    if status != 'scheduled':
+        for i in range(1, 8):
+            p1 = ev.get('homeScore', {}).get(f'period{i}')
+            p2 = ev.get('awayScore', {}).get(f'period{i}')
+            if p1 is not None and p2 is not None:
+                sets.append((p1, p2))
+    
+    start = ev.get('startTimestamp')
+    date = datetime.fromtimestamp(start, tz=timezone.utc).isoformat() if start else now_iso
+    
+    return Event(
+        ev.get('id', ''), date, status,
+        tournament.get('name', 'Table Tennis'),
+        tournament.get('category', {}).get('name', 'International'),
+        home.get('id', ''), home.get('name', 'Player 1'),
+        away.get('id', ''), away.get('name', 'Player 2'),
+        home_score, away_score,
+        'sofascore', sets=tuple(sets)
+    )
+
+
+def convert_apifootball_event(ev, now_iso):
+    """Конвертация события API-Football в универсальный формат; отменённые и прерванные — None"""
+    status_obj = ev.get('status') or {}
+    short = status_obj.get('short', '') if isinstance(status_obj, dict) else str(status_obj)
+    if short in APIFOOTBALL_DROPPED:
+        return None
+    if short in APIFOOTBALL_FINISHED:
+        status = 'FT'
+    elif short in APIFOOTBALL_LIVE:
+        status = 'LIVE'
+    else:
+        if short not in APIFOOTBALL_SCHEDULED:
+            print(f'API-Football unknown status {short!r}, treated as scheduled')
+        status = 'scheduled'
+    
+    league = ev.get('league') or {}
+    country = ev.get('country') or {}
+    teams = ev.get('teams') or {}
+    home = teams.get('home') or {}
+    away = teams.get('away') or {}
+    scores = ev.get('scores') or {}
+    home_score = scores.get('home')
+    away_score = scores.get('away')
+    if isinstance(home_score, dict):
+        home_score = home_score.get('total')
+    if isinstance(away_score, dict):
+        away_score = away_score.get('total')
+    
+    return Event(
+        ev.get('id', ''), ev.get('date') or now_iso, status,
+        league.get('name', 'Table Tennis'), country.get('name', 'International'),
+        home.get('id', ''), home.get('name', 'Player 1'),
+        away.get('id', ''), away.get('name', 'Player 2'),
+        home_score or 0, away_score or 0,
+        'api-football'
+    )
 
 
 def fetch_apifootball(api_key, endpoint, params=None):
@@ -450,6 +1880,7 @@ def fetch_apifootball(api_key, endpoint, params=None):
         
         req = urllib.request.Request(url, headers=headers)
         with urllib.request.urlopen(req, timeout=20) as resp:
+            record_quota(resp.headers)
             data = json.loads(resp.read().decode('utf-8'))
             
             if 'response' in data:
@@ -458,6 +1889,10 @@ def fetch_apifootball(api_key, endpoint, params=None):
                 print(f'API-Football response: {data.keys()}')
             
             return data
+    except urllib.error.HTTPError as e:
+        print(f'API-Football error: HTTP {e.code}')
+        record_quota(e.headers, exhausted=(e.code == 429))
+        return None
     except Exception as e:
         print(f'API-Football error: {str(e)}')
         return None
@@ -466,18 +1901,11 @@ def fetch_apifootball(api_key, endpoint, params=None):
 def is_liga_pro_apifootball(event):
     """Проверка Liga Pro для API-Football"""
     try:
-        league_name = ''
+        league_name = event.league.lower()
         
-        if isinstance(event, dict):
-            league = event.get('league', {})
-            if isinstance(league, dict):
-                league_name = league.get('name', '').lower()
-            
-            country = event.get('country', {})
-            if isinstance(country, dict):
-                country_name = country.get('name', '').lower()
-                if 'russia' in country_name or 'belarus' in country_name:
-                    return True
+        country_name = event.country.lower()
+        if 'russia' in country_name or 'belarus' in country_name:
+            return True
         
         keywords = ['liga pro', 'ligapro', 'setka cup', 'setka', 'tt cup', 'ttcup', 'masters', 'elite', 'win cup', 'wincup', 'challenge', 'russia', 'belarus', 'minsk']
         matched = any(kw in league_name for kw in keywords)
@@ -493,20 +1921,18 @@ def is_liga_pro_apifootball(event):
 
 def is_liga_pro_api(event):
     """Проверка Liga Pro для RapidAPI"""
-    league = event.get('league', {})
-    name = league.get('name', '').lower()
+    name = event.league.lower()
     keywords = ['liga pro', 'ligapro', 'setka cup', 'setka', 'tt cup', 'ttcup', 'masters', 'elite', 'win cup', 'wincup', 'challenge']
     return any(kw in name for kw in keywords)
 
 
 def is_liga_pro_scraped(event):
     """Проверка Liga Pro для scraped данных"""
-    league = event.get('league', {})
-    name = league.get('name', '').lower()
+    name = event.league.lower()
     keywords = ['liga pro', 'ligapro', 'setka cup', 'setka', 'tt cup', 'ttcup', 'masters', 'elite', 'win cup', 'wincup', 'challenge', 'liga stavok', 'russia', 'belarus', 'minsk', 'moscow']
     matched = any(kw in name for kw in keywords)
     
     if matched:
-        print(f'✓ Matched: {league.get("name")}')
+        print(f'✓ Matched: {event.league}')
     
     return True
\ No newline at end of file
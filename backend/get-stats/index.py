@@ -1,3 +1,4 @@
+import base64
 import json
 import os
 import psycopg2
@@ -11,6 +12,30 @@ CORS_HEADERS = {
     'Content-Type': 'application/json'
 }
 
+CALIBRATION_MIN = 45
+CALIBRATION_MAX = 100
+CALIBRATION_BUCKETS = 11
+
+# Прибыль ставки в 1 единицу: коэффициент выбранного игрока минус 1 при выигрыше, -1 при проигрыше
+BET_PROFIT_SQL = """
+    CASE
+        WHEN is_correct THEN
+            CASE WHEN predicted_winner = split_part(match_name, ' vs ', 1)
+                 THEN COALESCE(p1_odds, 1.8) ELSE COALESCE(p2_odds, 1.8) END - 1
+        ELSE -1
+    END
+"""
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+HISTORY_STATUS_FILTERS = {
+    'won': 'is_correct = true',
+    'lost': 'is_correct = false',
+    'pending': 'is_correct IS NULL AND settlement_status IS NULL',
+    'void': "settlement_status = 'void'",
+}
+
 
 def handler(event, context):
     """Получение статистики прогнозов из БД"""
@@ -27,6 +52,9 @@ def handler(event, context):
         }
 
     params = event.get('queryStringParameters') or {}
+    if params.get('view') == 'history':
+        return history_response(db_url, params)
+
     period = params.get('period', 'all')
 
     conn = psycopg2.connect(db_url)
@@ -46,7 +74,7 @@ def handler(event, context):
             COUNT(*) as total,
             COUNT(*) FILTER (WHERE is_correct = true) as correct,
             COUNT(*) FILTER (WHERE is_correct = false) as incorrect,
-            COUNT(*) FILTER (WHERE is_correct IS NULL) as pending,
+            COUNT(*) FILTER (WHERE is_correct IS NULL AND settlement_status IS NULL) as pending,
             AVG((p1_odds + p2_odds) / 2) as avg_odds,
             COUNT(*) FILTER (WHERE bet_type = 'strong') as strong_count,
             COUNT(*) FILTER (WHERE bet_type = 'medium') as medium_count,
@@ -66,7 +94,18 @@ def handler(event, context):
     risky_count = row[7] or 0
 
     win_rate = round((correct / total * 100), 1) if total > 0 else 0
-    roi = round((avg_odds * win_rate / 100 - 1) * 100, 1) if total > 0 else 0
+
+    cur.execute(f"""
+        SELECT
+            COUNT(*),
+            COALESCE(SUM({BET_PROFIT_SQL}), 0)
+        FROM predictions
+        WHERE is_correct IS NOT NULL {date_filter}
+    """)
+    row = cur.fetchone()
+    settled = row[0] or 0
+    profit = float(row[1] or 0)
+    roi = round(profit / settled * 100, 1) if settled > 0 else 0
 
     cur.execute(f"""
         SELECT
@@ -131,6 +170,78 @@ def handler(event, context):
             'correct': day_correct
         })
 
+    cur.execute(f"""
+        SELECT
+            LEAST(GREATEST(width_bucket(confidence, {CALIBRATION_MIN}, {CALIBRATION_MAX}, {CALIBRATION_BUCKETS}), 1), {CALIBRATION_BUCKETS}) as bucket,
+            COUNT(*) as total,
+            COUNT(*) FILTER (WHERE is_correct = true) as correct,
+            AVG(confidence) as avg_confidence
+        FROM predictions
+        WHERE is_correct IS NOT NULL {date_filter}
+        GROUP BY bucket
+        ORDER BY bucket
+    """)
+    step = (CALIBRATION_MAX - CALIBRATION_MIN) // CALIBRATION_BUCKETS
+    calibration_data = []
+    for row in cur.fetchall():
+        bucket_from = CALIBRATION_MIN + (row[0] - 1) * step
+        calibration_data.append({
+            'bucket': f'{bucket_from}-{bucket_from + step - 1}',
+            'total': row[1],
+            'predicted': round(float(row[3]), 1),
+            'actual': round((row[2] / row[1] * 100), 1) if row[1] > 0 else 0
+        })
+
+    cur.execute(f"""
+        SELECT
+            COALESCE(bet_type, 'unknown') as bet_type,
+            COUNT(*) as total,
+            COUNT(*) FILTER (WHERE is_correct = true) as correct,
+            COALESCE(SUM({BET_PROFIT_SQL}), 0) as profit
+        FROM predictions
+        WHERE is_correct IS NOT NULL {date_filter}
+        GROUP BY 1
+        ORDER BY total DESC
+    """)
+    bet_type_data = []
+    for row in cur.fetchall():
+        bet_type_data.append({
+            'betType': row[0],
+            'total': row[1],
+            'correct': row[2],
+            'winRate': round((row[2] / row[1] * 100), 1) if row[1] > 0 else 0,
+            'roi': round(float(row[3]) / row[1] * 100, 1) if row[1] > 0 else 0
+        })
+
+    cur.execute(f"""
+        SELECT
+            day,
+            bets,
+            profit,
+            SUM(profit) OVER (ORDER BY day) as cumulative_profit,
+            SUM(bets) OVER (ORDER BY day) as cumulative_bets
+        FROM (
+            SELECT
+                DATE(created_at) as day,
+                COUNT(*) as bets,
+                SUM({BET_PROFIT_SQL}) as profit
+            FROM predictions
+            WHERE is_correct IS NOT NULL {date_filter}
+            GROUP BY 1
+        ) d
+        ORDER BY day DESC
+        LIMIT 30
+    """)
+    roi_series = []
+    for row in cur.fetchall():
+        roi_series.append({
+            'date': row[0].strftime('%Y-%m-%d'),
+            'bets': row[1],
+            'profit': round(float(row[2]), 2),
+            'cumulativeProfit': round(float(row[3]), 2),
+            'roi': round(float(row[3]) / row[4] * 100, 1) if row[4] else 0
+        })
+
     cur.close()
     conn.close()
 
@@ -152,6 +263,116 @@ def handler(event, context):
             'riskyCount': risky_count,
             'byLeague': leagues_data,
             'daily': daily_data,
+            'calibration': calibration_data,
+            'byBetType': bet_type_data,
+            'roiSeries': roi_series,
             'updatedAt': now.isoformat()
         }, ensure_ascii=False)
     }
+
+
+def encode_cursor(created_at, row_id):
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{row_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+    return datetime.fromisoformat(created_at), int(row_id)
+
+
+def history_response(db_url, params):
+    """Лента отдельных прогнозов с keyset-пагинацией по (created_at, id).
+
+    Курсор — последняя строка предыдущей страницы, поэтому любая страница
+    читается из индекса idx_predictions_history так же дёшево, как первая.
+    """
+    try:
+        limit = min(max(int(params.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+        cursor = decode_cursor(params['cursor']) if params.get('cursor') else None
+        date_from = datetime.fromisoformat(params['from']) if params.get('from') else None
+        date_to = datetime.fromisoformat(params['to']) if params.get('to') else None
+    except (ValueError, TypeError) as e:
+        return {
+            'statusCode': 400,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'error': f'Bad history params: {str(e)}'}, ensure_ascii=False)
+        }
+
+    status = params.get('status', '')
+    if status and status not in HISTORY_STATUS_FILTERS:
+        return {
+            'statusCode': 400,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'error': f'Unknown status: {status}'}, ensure_ascii=False)
+        }
+
+    conditions = []
+    args = []
+    if params.get('league'):
+        conditions.append('league = %s')
+        args.append(params['league'])
+    if params.get('betType'):
+        conditions.append('bet_type = %s')
+        args.append(params['betType'])
+    if status:
+        conditions.append(HISTORY_STATUS_FILTERS[status])
+    if date_from:
+        conditions.append('created_at >= %s')
+        args.append(date_from)
+    if date_to:
+        conditions.append('created_at < %s')
+        args.append(date_to)
+    if cursor:
+        conditions.append('(created_at, id) < (%s, %s)')
+        args.extend(cursor)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT
+            id, created_at, match_id, match_name, league, predicted_winner, actual_winner,
+            confidence, bet_type, p1_odds, p2_odds, is_correct, settlement_status, match_start_time
+        FROM predictions
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, args + [limit + 1])
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        if row[11] is not None:
+            result = 'won' if row[11] else 'lost'
+        else:
+            result = row[12] or 'pending'
+        items.append({
+            'id': row[0],
+            'createdAt': row[1].isoformat(),
+            'matchId': row[2],
+            'matchName': row[3],
+            'league': row[4],
+            'predictedWinner': row[5],
+            'actualWinner': row[6],
+            'confidence': row[7],
+            'betType': row[8],
+            'p1Odds': float(row[9]) if row[9] is not None else None,
+            'p2Odds': float(row[10]) if row[10] is not None else None,
+            'status': result,
+            'startTime': row[13].isoformat() if row[13] else None
+        })
+
+    return {
+        'statusCode': 200,
+        'headers': CORS_HEADERS,
+        'body': json.dumps({
+            'items': items,
+            'nextCursor': encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+        }, ensure_ascii=False)
+    }
@@ -1,62 +1,316 @@
 import json
+import math
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
 import urllib.request
+import psycopg2
 
 CORS_HEADERS = {
     'Access-Control-Allow-Origin': '*',
     'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
     'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, X-Session-Id',
+    'Access-Control-Expose-Headers': 'Retry-After, X-Cache',
     'Access-Control-Max-Age': '86400',
     'Content-Type': 'application/json'
 }
 
 UA = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
 
+ALLOWED_HOSTS = {'api.sofascore.com', 'www.sofascore.com'}
+
+# Разрешённые пути SofaScore и время жизни кэша ответа для каждого из них
+ALLOWED_PATHS = [
+    (re.compile(r'^/api/v1/sport/table-tennis/events/live$'), 5),
+    (re.compile(r'^/api/v1/sport/table-tennis/scheduled-events/\d{4}-\d{2}-\d{2}$'), 120),
+    (re.compile(r'^/api/v1/event/\d+$'), 15),
+    (re.compile(r'^/api/v1/event/\d+/(statistics|point-by-point|incidents|h2h)$'), 30),
+    (re.compile(r'^/api/v1/team/\d+/events/last/\d+$'), 600),
+]
+
+BUCKET_NAME = 'sofascore'
+BUCKET_RATE = float(os.environ.get('PROXY_RATE_PER_SECOND', '2'))
+BUCKET_CAPACITY = float(os.environ.get('PROXY_BURST', '10'))
+
+QUEUE_MAX_WAITERS = 8
+QUEUE_DEADLINE_SECONDS = 3.0
+STALE_MAX_SECONDS = 600
+CACHE_MAX_ENTRIES = 300
+UPSTREAM_BLOCK_SECONDS = 60
+FETCH_TIMEOUT_SECONDS = 10
+
+response_cache = {}
+cache_lock = threading.Lock()
+
+# Single-flight: один запрос к апстриму на канонический URL, остальные ждут его результат
+inflight = {}
+inflight_lock = threading.Lock()
+
+local_bucket = {'tokens': BUCKET_CAPACITY, 'at': time.monotonic()}
+bucket_lock = threading.Lock()
+
+queue_waiters = 0
+queue_lock = threading.Lock()
+
+upstream_blocked_until = 0.0
+
 
 def handler(event, context):
-    """CORS-прокси для SofaScore API"""
-    
+    """CORS-прокси для SofaScore API с общим лимитом запросов к апстриму"""
+
     if event.get('httpMethod') == 'OPTIONS':
         return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': ''}
-    
+
     params = event.get('queryStringParameters') or {}
-    url = params.get('url', '')
-    
-    if not url or 'sofascore.com' not in url:
+    url, ttl = validate_url(params.get('url', ''))
+
+    if not url:
         return {
             'statusCode': 400,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'error': 'Требуется параметр ?url= с SofaScore URL'}, ensure_ascii=False)
+            'body': json.dumps({'error': 'Требуется параметр ?url= с разрешённым SofaScore URL'}, ensure_ascii=False)
         }
-    
+
+    cached = response_cache.get(url)
+    if cached and time.time() - cached['fetchedAt'] < ttl:
+        return cached_response(cached, 'HIT')
+
+    with inflight_lock:
+        flight = inflight.get(url)
+        leader = flight is None
+        if leader:
+            flight = inflight[url] = threading.Event()
+
+    if not leader:
+        return follow_flight(url, flight, ttl)
+
     try:
-        headers = {
-            'User-Agent': UA,
-            'Accept': 'application/json',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Referer': 'https://www.sofascore.com/',
-            'Origin': 'https://www.sofascore.com',
-            'Connection': 'keep-alive'
+        return fetch_as_leader(url, ttl)
+    finally:
+        with inflight_lock:
+            inflight.pop(url, None)
+        flight.set()
+
+
+def follow_flight(url, flight, ttl):
+    """Ждём запрос-лидер по тому же URL и отдаём его результат из кэша, не тратя токен"""
+    flight.wait(QUEUE_DEADLINE_SECONDS + FETCH_TIMEOUT_SECONDS)
+    cached = response_cache.get(url)
+    if cached:
+        age = time.time() - cached['fetchedAt']
+        if age < ttl:
+            return cached_response(cached, 'HIT')
+        if age < STALE_MAX_SECONDS:
+            return cached_response(cached, 'STALE')
+    return {
+        'statusCode': 503,
+        'headers': {**CORS_HEADERS, 'Retry-After': '1'},
+        'body': json.dumps({'error': 'Источник недоступен, повторите позже'}, ensure_ascii=False)
+    }
+
+
+def fetch_as_leader(url, ttl):
+    wait = admit()
+    # Пока ждали токен, кэш мог обновиться — тогда апстрим не нужен
+    cached = response_cache.get(url)
+    now = time.time()
+    if cached and now - cached['fetchedAt'] < ttl:
+        return cached_response(cached, 'HIT')
+
+    if wait > 0:
+        if cached and now - cached['fetchedAt'] < STALE_MAX_SECONDS:
+            return cached_response(cached, 'STALE', wait)
+        return {
+            'statusCode': 429,
+            'headers': {**CORS_HEADERS, 'Retry-After': str(math.ceil(wait))},
+            'body': json.dumps({'error': 'Слишком много запросов, повторите позже'}, ensure_ascii=False)
         }
-        
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            data = resp.read()
-            
-            return {
-                'statusCode': 200,
-                'headers': CORS_HEADERS,
-                'body': data.decode('utf-8')
-            }
-    
+
+    try:
+        body = fetch_upstream(url)
     except urllib.error.HTTPError as e:
+        if e.code in (403, 429):
+            block_upstream(e.headers.get('Retry-After'))
+        if cached:
+            return cached_response(cached, 'STALE', UPSTREAM_BLOCK_SECONDS if e.code in (403, 429) else 0)
+        headers = CORS_HEADERS
+        if e.code in (403, 429):
+            headers = {**CORS_HEADERS, 'Retry-After': str(UPSTREAM_BLOCK_SECONDS)}
         return {
             'statusCode': e.code,
-            'headers': CORS_HEADERS,
+            'headers': headers,
             'body': json.dumps({'error': f'HTTP {e.code}: {e.reason}'}, ensure_ascii=False)
         }
     except Exception as e:
+        if cached:
+            return cached_response(cached, 'STALE')
         return {
             'statusCode': 500,
             'headers': CORS_HEADERS,
             'body': json.dumps({'error': str(e)}, ensure_ascii=False)
         }
+
+    store_response(url, body)
+    return {
+        'statusCode': 200,
+        'headers': {**CORS_HEADERS, 'X-Cache': 'MISS'},
+        'body': body
+    }
+
+
+def validate_url(raw):
+    """Строгая проверка URL: только https, точный хост и путь из списка; возвращает канонический URL и TTL"""
+    try:
+        parts = urllib.parse.urlsplit(raw)
+        if parts.scheme != 'https' or parts.username or parts.password or parts.port:
+            return None, 0
+    except ValueError:
+        return None, 0
+
+    if (parts.hostname or '').lower() not in ALLOWED_HOSTS:
+        return None, 0
+
+    for pattern, ttl in ALLOWED_PATHS:
+        if pattern.match(parts.path):
+            # Query-строка не пробрасывается: все разрешённые пути её не используют
+            return f'https://{parts.hostname.lower()}{parts.path}', ttl
+    return None, 0
+
+
+def cached_response(cached, state, retry_after=0):
+    headers = {**CORS_HEADERS, 'X-Cache': state}
+    if retry_after > 0:
+        headers['Retry-After'] = str(math.ceil(retry_after))
+    return {'statusCode': 200, 'headers': headers, 'body': cached['body']}
+
+
+def store_response(url, body):
+    with cache_lock:
+        if len(response_cache) >= CACHE_MAX_ENTRIES and url not in response_cache:
+            oldest = min(response_cache, key=lambda k: response_cache[k]['fetchedAt'])
+            response_cache.pop(oldest, None)
+        response_cache[url] = {'body': body, 'fetchedAt': time.time()}
+
+
+def block_upstream(retry_after):
+    """SofaScore ответил 403/429 — не ходим к нему до истечения Retry-After"""
+    global upstream_blocked_until
+    try:
+        seconds = float(retry_after) if retry_after else UPSTREAM_BLOCK_SECONDS
+    except ValueError:
+        seconds = UPSTREAM_BLOCK_SECONDS
+    upstream_blocked_until = max(upstream_blocked_until, time.time() + seconds)
+    print(f'Upstream blocked for {seconds:.0f}s')
+
+
+def admit():
+    """Допуск запроса к апстриму: 0 — можно идти, иначе через сколько секунд повторить.
+
+    Без свободного токена запрос встаёт в ограниченную очередь и ждёт
+    не дольше QUEUE_DEADLINE_SECONDS; при переполненной очереди отказ сразу.
+    """
+    global queue_waiters
+
+    blocked = upstream_blocked_until - time.time()
+    if blocked > 0:
+        return blocked
+
+    wait = take_token()
+    if wait == 0:
+        return 0
+
+    with queue_lock:
+        if queue_waiters >= QUEUE_MAX_WAITERS:
+            return wait
+        queue_waiters += 1
+
+    try:
+        deadline = time.monotonic() + QUEUE_DEADLINE_SECONDS
+        while wait > 0:
+            left = deadline - time.monotonic()
+            if wait > left:
+                return wait
+            time.sleep(wait)
+            wait = take_token()
+        return 0
+    finally:
+        with queue_lock:
+            queue_waiters -= 1
+
+
+def take_token():
+    """Токен из общего бакета в БД; без БД — из бакета текущего инстанса"""
+    db_url = os.environ.get('DATABASE_URL', '')
+    if db_url:
+        try:
+            return take_db_token(db_url)
+        except Exception as e:
+            print(f'Rate limit DB error: {str(e)}')
+    return take_local_token()
+
+
+def take_db_token(db_url):
+    """Атомарное пополнение и списание токена одной строкой — общий лимит для всех инстансов"""
+    conn = psycopg2.connect(db_url, connect_timeout=3)
+    cur = conn.cursor()
+    args = {'name': BUCKET_NAME, 'capacity': BUCKET_CAPACITY, 'rate': BUCKET_RATE}
+
+    cur.execute("""
+        UPDATE proxy_rate_limit SET
+            tokens = LEAST(%(capacity)s, tokens + EXTRACT(EPOCH FROM NOW() - updated_at) * %(rate)s) - 1,
+            updated_at = NOW()
+        WHERE name = %(name)s
+          AND LEAST(%(capacity)s, tokens + EXTRACT(EPOCH FROM NOW() - updated_at) * %(rate)s) >= 1
+        RETURNING tokens
+    """, args)
+    wait = 0
+    if cur.fetchone() is None:
+        cur.execute("""
+            SELECT LEAST(%(capacity)s, tokens + EXTRACT(EPOCH FROM NOW() - updated_at) * %(rate)s)
+            FROM proxy_rate_limit
+            WHERE name = %(name)s
+        """, args)
+        row = cur.fetchone()
+        if row is None:
+            cur.execute("""
+                INSERT INTO proxy_rate_limit (name, tokens, updated_at)
+                VALUES (%(name)s, %(capacity)s - 1, NOW())
+                ON CONFLICT (name) DO NOTHING
+            """, args)
+        else:
+            wait = max((1 - float(row[0])) / BUCKET_RATE, 0.05)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+    return wait
+
+
+def take_local_token():
+    with bucket_lock:
+        now = time.monotonic()
+        tokens = min(BUCKET_CAPACITY, local_bucket['tokens'] + (now - local_bucket['at']) * BUCKET_RATE)
+        local_bucket['at'] = now
+        if tokens >= 1:
+            local_bucket['tokens'] = tokens - 1
+            return 0
+        local_bucket['tokens'] = tokens
+        return max((1 - tokens) / BUCKET_RATE, 0.05)
+
+
+def fetch_upstream(url):
+    headers = {
+        'User-Agent': UA,
+        'Accept': 'application/json',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Referer': 'https://www.sofascore.com/',
+        'Origin': 'https://www.sofascore.com',
+        'Connection': 'keep-alive'
+    }
+
+    req = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT_SECONDS) as resp:
+        return resp.read().decode('utf-8')
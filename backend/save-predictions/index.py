@@ -1,6 +1,10 @@
+import base64
+import itertools
 import json
 import os
+import re
 import psycopg2
+import psycopg2.extras
 from datetime import datetime, timezone
 
 CORS_HEADERS = {
@@ -11,6 +15,19 @@ CORS_HEADERS = {
     'Content-Type': 'application/json'
 }
 
+CHUNK_SIZE = 200
+MAX_ERRORS = 50
+ODDS_MAX = 1000
+INT_MAX = 2 ** 31 - 1
+
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya', 'і': 'i', 'ў': 'u'
+})
+
 
 def handler(event, context):
     """Сохранение прогнозов в БД и обновление результатов"""
@@ -26,12 +43,18 @@ def handler(event, context):
             'body': json.dumps({'error': 'DATABASE_URL not configured'}, ensure_ascii=False)
         }
 
-    body = {}
-    if event.get('body'):
-        body = json.loads(event['body'])
+    raw = event.get('body') or ''
+    if raw and event.get('isBase64Encoded'):
+        raw = base64.b64decode(raw).decode('utf-8')
 
-    matches = body.get('matches', [])
-    if not matches:
+    if is_ndjson(event):
+        records = iter_ndjson(raw)
+    else:
+        body = json.loads(raw) if raw else {}
+        records = ((i + 1, m) for i, m in enumerate(body.get('matches', [])))
+
+    first = next(records, None)
+    if first is None:
         return {
             'statusCode': 400,
             'headers': CORS_HEADERS,
@@ -41,73 +64,325 @@ def handler(event, context):
     conn = psycopg2.connect(db_url)
     cur = conn.cursor()
 
+    received = 0
     saved = 0
     updated = 0
     errors = []
+    chunks = []
+    chunk = []
 
-    for m in matches:
+    for line_no, record in itertools.chain([first], records):
+        received += 1
         try:
-            match_id = m.get('id')
-            if not match_id or not m.get('prediction'):
-                continue
+            if isinstance(record, Exception):
+                raise record
+            chunk.append(slim_record(record))
+        except Exception as e:
+            add_error(errors, f"#{line_no}: {str(e)[:50]}")
 
-            p1_name = m.get('player1', {}).get('name', '')
-            p2_name = m.get('player2', {}).get('name', '')
-            match_name = f"{p1_name} vs {p2_name}"
-
-            pred = m['prediction']
-            predicted_winner = p1_name if pred['winner'] == 'p1' else p2_name
-
-            actual_winner = None
-            is_correct = None
-            finish_time = None
-
-            if m.get('status') == 'finished' and m.get('score'):
-                score = m['score']
-                actual_winner = p1_name if score['p1'] > score['p2'] else p2_name
-                is_correct = (predicted_winner == actual_winner)
-                finish_time = datetime.now(timezone.utc)
-
-            start_time = m.get('startTime', datetime.now(timezone.utc).isoformat())
-
-            cur.execute("""
-                INSERT INTO predictions (
-                    match_id, match_name, league, predicted_winner,
-                    actual_winner, confidence, bet_type, p1_odds, p2_odds,
-                    is_correct, match_start_time, match_finish_time
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (match_id) DO UPDATE SET
-                    actual_winner = EXCLUDED.actual_winner,
-                    is_correct = EXCLUDED.is_correct,
-                    match_finish_time = EXCLUDED.match_finish_time,
-                    updated_at = NOW()
-            """, (
-                match_id, match_name, m.get('league', ''),
-                predicted_winner, actual_winner,
-                pred.get('confidence', 50), pred.get('betType', 'medium'),
-                m.get('odds', {}).get('p1Win', 1.8), m.get('odds', {}).get('p2Win', 1.8),
-                is_correct, start_time, finish_time
-            ))
-
-            if cur.rowcount > 0:
-                if is_correct is not None:
-                    updated += 1
-                else:
-                    saved += 1
+        if len(chunk) >= CHUNK_SIZE:
+            chunks.append(flush_chunk(cur, len(chunks) + 1, chunk, errors))
+            chunk = []
 
-        except Exception as e:
-            errors.append(f"{m.get('id', 'unknown')}: {str(e)[:50]}")
+    if chunk:
+        chunks.append(flush_chunk(cur, len(chunks) + 1, chunk, errors))
 
-    conn.commit()
     cur.close()
     conn.close()
 
+    for c in chunks:
+        saved += c['saved']
+        updated += c['updated']
+
     return {
         'statusCode': 200,
         'headers': CORS_HEADERS,
         'body': json.dumps({
+            'received': received,
             'saved': saved,
             'updated': updated,
+            'chunks': chunks,
             'errors': errors if errors else None
         }, ensure_ascii=False)
     }
+
+
+def is_ndjson(event):
+    params = event.get('queryStringParameters') or {}
+    if params.get('format') == 'ndjson':
+        return True
+    headers = event.get('headers') or {}
+    content_type = headers.get('Content-Type') or headers.get('content-type') or ''
+    return 'ndjson' in content_type
+
+
+def iter_ndjson(raw):
+    """Построчный разбор NDJSON по срезам тела без его копии: в памяти одновременно только одна запись"""
+    line_no = 0
+    start = 0
+    size = len(raw)
+    while start < size:
+        end = raw.find('\n', start)
+        if end == -1:
+            end = size
+        line_no += 1
+        line = raw[start:end].strip()
+        start = end + 1
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, ValueError(f'invalid JSON: {str(e)}')
+
+
+def add_error(errors, message):
+    if len(errors) < MAX_ERRORS:
+        errors.append(message)
+
+
+def slim_record(m):
+    """Полный Match с фронтенда или облегчённая запись → поля таблицы predictions.
+
+    Облегчённая схема: id, league, startTime, status, p1, p2, p1Id, p2Id,
+    winner ('p1' | 'p2'), confidence, betType, p1Odds, p2Odds, score {p1, p2}.
+    """
+    if not isinstance(m, dict):
+        raise ValueError('record must be an object')
+
+    match_id = m.get('id')
+    if not match_id:
+        raise ValueError('missing id')
+    if 'player1' in m:
+        pred = m.get('prediction')
+        if not isinstance(pred, dict):
+            raise ValueError('missing prediction')
+        odds = m.get('odds') or {}
+        m = {
+            'id': match_id,
+            'league': m.get('league', ''),
+            'startTime': m.get('startTime'),
+            'status': m.get('status'),
+            'p1': (m.get('player1') or {}).get('name', ''),
+            'p2': (m.get('player2') or {}).get('name', ''),
+            'p1Id': (m.get('player1') or {}).get('playerId'),
+            'p2Id': (m.get('player2') or {}).get('playerId'),
+            'winner': pred.get('winner'),
+            'confidence': pred.get('confidence'),
+            'betType': pred.get('betType'),
+            'p1Odds': odds.get('p1Win'),
+            'p2Odds': odds.get('p2Win'),
+            'score': m.get('score'),
+        }
+
+    if not m.get('winner'):
+        raise ValueError('missing winner')
+    if m['winner'] not in ('p1', 'p2'):
+        raise ValueError(f"bad winner {m['winner']!r}")
+    if not m.get('p1') or not m.get('p2'):
+        raise ValueError('missing player names')
+
+    score = m.get('score')
+    if m.get('status') == 'finished' and score:
+        if not isinstance(score.get('p1'), int) or not isinstance(score.get('p2'), int):
+            raise ValueError('bad score')
+    else:
+        score = None
+
+    confidence = check_int(m.get('confidence'), 'confidence', 0, 100)
+
+    return {
+        'id': check_text(str(match_id), 'id', 100),
+        'league': check_text(m.get('league') or '', 'league', 200),
+        'startTime': check_time(m.get('startTime')),
+        'p1': check_text(m['p1'], 'p1', 100),
+        'p2': check_text(m['p2'], 'p2', 100),
+        'p1Id': check_int(m.get('p1Id'), 'p1Id', 1, INT_MAX),
+        'p2Id': check_int(m.get('p2Id'), 'p2Id', 1, INT_MAX),
+        'winner': m['winner'],
+        'confidence': 50 if confidence is None else confidence,
+        'betType': check_text(m.get('betType') or 'medium', 'betType', 20),
+        'p1Odds': check_odds(m.get('p1Odds'), 'p1Odds'),
+        'p2Odds': check_odds(m.get('p2Odds'), 'p2Odds'),
+        'score': score,
+    }
+
+
+def check_text(value, field, max_len):
+    if not isinstance(value, str) or len(value) > max_len:
+        raise ValueError(f'bad {field}')
+    return value
+
+
+def check_int(value, field, low=None, high=None):
+    if value is None:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f'bad {field}')
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise ValueError(f'{field} out of range')
+    return value
+
+
+def check_odds(value, field):
+    """Коэффициент должен помещаться в DECIMAL(5,2)"""
+    if value is None:
+        return 1.8
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not 1 <= value < ODDS_MAX:
+        raise ValueError(f'bad {field}')
+    return value
+
+
+def check_time(value):
+    if value is None:
+        return datetime.now(timezone.utc).isoformat()
+    if not isinstance(value, str):
+        raise ValueError('bad startTime')
+    try:
+        datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('bad startTime')
+    return value
+
+
+def flush_chunk(cur, number, chunk, errors):
+    """Один INSERT ... ON CONFLICT на чанк, коммит после каждого чанка.
+    Если чанк целиком не прошёл, строки пишутся по одной — плохая строка не тянет за собой остальные."""
+    rows = {}
+    player_ids = resolve_player_ids(cur, chunk)
+    finish_time = datetime.now(timezone.utc)
+
+    for r in chunk:
+        p1_name, p2_name = r['p1'], r['p2']
+        p1_id = r['p1Id'] or player_ids.get(p1_name)
+        p2_id = r['p2Id'] or player_ids.get(p2_name)
+
+        predicted_p1 = r['winner'] == 'p1'
+        actual_winner = None
+        actual_winner_id = None
+        is_correct = None
+        if r['score']:
+            p1_won = r['score']['p1'] > r['score']['p2']
+            actual_winner = p1_name if p1_won else p2_name
+            actual_winner_id = p1_id if p1_won else p2_id
+            is_correct = (predicted_p1 == p1_won)
+
+        # Повтор match_id внутри одного INSERT недопустим для ON CONFLICT — берём последнюю запись
+        rows[r['id']] = (
+            r['id'], f"{p1_name} vs {p2_name}", r['league'],
+            p1_name if predicted_p1 else p2_name, actual_winner,
+            r['confidence'], r['betType'], r['p1Odds'], r['p2Odds'],
+            is_correct, r['startTime'], finish_time if is_correct is not None else None,
+            p1_id, p2_id, p1_id if predicted_p1 else p2_id, actual_winner_id
+        )
+
+    values = list(rows.values())
+    result = {'chunk': number, 'records': len(chunk), 'saved': 0, 'updated': 0, 'ok': True}
+    try:
+        upsert_predictions(cur, values)
+        cur.connection.commit()
+        written = values
+    except Exception as e:
+        cur.connection.rollback()
+        result['ok'] = False
+        add_error(errors, f"chunk {number}: {str(e)[:80]}")
+        written = []
+        for v in values:
+            try:
+                upsert_predictions(cur, [v])
+                cur.connection.commit()
+                written.append(v)
+            except Exception as e:
+                cur.connection.rollback()
+                add_error(errors, f"{v[0]}: {str(e)[:50]}")
+
+    result['updated'] = sum(1 for v in written if v[9] is not None)
+    result['saved'] = len(written) - result['updated']
+    print(f"Chunk {number}: {len(written)}/{len(values)} rows, ok={result['ok']}")
+    return result
+
+
+def upsert_predictions(cur, values):
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO predictions (
+            match_id, match_name, league, predicted_winner,
+            actual_winner, confidence, bet_type, p1_odds, p2_odds,
+            is_correct, match_start_time, match_finish_time,
+            p1_player_id, p2_player_id, predicted_winner_id, actual_winner_id
+        ) VALUES %s
+        ON CONFLICT (match_id) DO UPDATE SET
+            actual_winner = COALESCE(EXCLUDED.actual_winner, predictions.actual_winner),
+            actual_winner_id = COALESCE(EXCLUDED.actual_winner_id, predictions.actual_winner_id),
+            is_correct = COALESCE(EXCLUDED.is_correct, predictions.is_correct),
+            match_finish_time = COALESCE(EXCLUDED.match_finish_time, predictions.match_finish_time),
+            settlement_status = CASE
+                WHEN EXCLUDED.is_correct IS NOT NULL THEN 'settled'
+                ELSE predictions.settlement_status
+            END,
+            updated_at = NOW()
+    """, values, page_size=len(values))
+
+
+def normalize_name(name):
+    """Нормализация имени игрока — та же, что в get-matches"""
+    text = str(name).lower().translate(TRANSLIT)
+    text = re.sub(r'[^a-z0-9]+', ' ', text)
+    return ' '.join(text.split())
+
+
+def name_keys(name):
+    """Точные ключи алиасов — та же логика, что в get-matches"""
+    norm = normalize_name(name)
+    parts = norm.split()
+    if len(parts) < 2:
+        return [norm] if norm else []
+    return list(dict.fromkeys([norm, f'{parts[-1]} {parts[0]}']))
+
+
+def is_short_form(key):
+    return any(len(part) == 1 for part in key.split())
+
+
+def resolve_player_ids(cur, rows):
+    """Имя → player_id по реестру алиасов, одним запросом на весь чанк"""
+    names = {r[side] for r in rows for side in ('p1', 'p2') if r[side]}
+
+    keys_by_name = {name: name_keys(name) for name in names}
+    all_keys = list({k for keys in keys_by_name.values() for k in keys})
+    if not all_keys:
+        return {}
+    # Короткие формы хранятся как «~ключ#player_id» — по строке на каждого игрока
+    short_patterns = list({f'~{k}#%' for keys in keys_by_name.values() if keys and is_short_form(keys[0]) for k in keys})
+
+    try:
+        cur.execute("""
+            SELECT alias_key, player_id FROM player_aliases
+            WHERE alias_key = ANY(%s) OR alias_key LIKE ANY(%s)
+        """, (all_keys, short_patterns))
+        index = {}
+        shorts = {}
+        for alias_key, player_id in cur.fetchall():
+            if alias_key.startswith('~'):
+                shorts.setdefault(alias_key[1:].rsplit('#', 1)[0], set()).add(player_id)
+            else:
+                index[alias_key] = player_id
+    except Exception as e:
+        print(f'Player resolve error: {str(e)}')
+        cur.connection.rollback()
+        return {}
+
+    resolved = {}
+    for name, keys in keys_by_name.items():
+        if not keys:
+            continue
+        if is_short_form(keys[0]):
+            # Короткое имя — только если ему соответствует ровно один игрок
+            candidates = {pid for k in keys for pid in shorts.get(k, ())}
+            if len(candidates) == 1:
+                resolved[name] = candidates.pop()
+            if candidates:
+                continue
+        player_id = next((index[k] for k in keys if k in index), None)
+        if player_id:
+            resolved[name] = player_id
+    return resolved
@@ -0,0 +1,420 @@
+import json
+import os
+import re
+import ssl
+import urllib.error
+import urllib.request
+import psycopg2
+import psycopg2.extras
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, X-Session-Id',
+    'Access-Control-Max-Age': '86400',
+    'Content-Type': 'application/json'
+}
+
+UA = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
+
+SETTLE_GRACE_MINUTES = 20
+SETTLE_BATCH_LIMIT = 500
+SETTLE_VOID_AFTER_DAYS = 3
+MAX_WORKERS = 4
+MAX_EVENT_LOOKUPS = 60
+MAX_APIFOOTBALL_DAYS = 5
+APIFOOTBALL_FINISHED = ('FT', 'AET', 'AOT', 'AP', 'AW', 'AWD', 'WO')
+
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya', 'і': 'i', 'ў': 'u'
+})
+
+
+def handler(event, context):
+    """Расчёт результатов ожидающих прогнозов (запускается по расписанию)"""
+
+    if event.get('httpMethod') == 'OPTIONS':
+        return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': ''}
+
+    db_url = os.environ.get('DATABASE_URL', '')
+    if not db_url:
+        return {
+            'statusCode': 500,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'error': 'DATABASE_URL not configured'}, ensure_ascii=False)
+        }
+
+    params = event.get('queryStringParameters') or {}
+    limit = min(int(params.get('limit', SETTLE_BATCH_LIMIT)), SETTLE_BATCH_LIMIT)
+
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT id, match_id, match_name, predicted_winner, p1_player_id, p2_player_id,
+               DATE(match_start_time AT TIME ZONE 'UTC')
+        FROM predictions
+        WHERE is_correct IS NULL
+          AND settlement_status IS NULL
+          AND match_start_time < NOW() - %s * INTERVAL '1 minute'
+        ORDER BY match_start_time
+        LIMIT %s
+    """, (SETTLE_GRACE_MINUTES, limit))
+    pending = cur.fetchall()
+    print(f'Pending predictions: {len(pending)}')
+
+    # match_id не хранит источник: id API-Football и SofaScore могут совпасть,
+    # поэтому результат принимается только если игроки совпадают с match_name / player_id
+    results = {}
+    # Строки, по которым источник ответил: только их можно аннулировать, если результата нет
+    sofascore_checked = set()
+    apifootball_checked = set()
+    api_key = os.environ.get('RAPID_API_KEY', '')
+    if pending:
+        match_ids = [row[1] for row in pending]
+        verify_results(pending, results, fetch_snapshot_results(cur, match_ids))
+        print(f'Results from events snapshot: {len(results)}')
+
+        missing = [row for row in pending if row[0] not in results]
+        days = sorted({row_day(row) for row in missing})
+        found, checked_days = fetch_sofascore_days(days, {row[1] for row in missing})
+        verify_results(missing, results, found)
+        sofascore_checked.update(row[0] for row in missing if row_day(row) in checked_days)
+
+        if api_key:
+            missing = [row for row in pending if row[0] not in results]
+            days = sorted({row_day(row) for row in missing})[:MAX_APIFOOTBALL_DAYS]
+            found, checked_days = fetch_apifootball_days(api_key, days, {row[1] for row in missing})
+            verify_results(missing, results, found)
+            apifootball_checked.update(row[0] for row in missing if row_day(row) in checked_days)
+
+        missing = [row for row in pending if row[0] not in results and row[1].isdigit()]
+        lookups = sorted({row[1] for row in missing})[:MAX_EVENT_LOOKUPS]
+        found, checked_ids = fetch_sofascore_events(lookups)
+        verify_results(missing, results, found)
+        sofascore_checked.update(row[0] for row in missing if row[1] in checked_ids)
+        print(f'Results total: {len(results)}')
+
+    outcomes = []
+    for row_id, match_id, match_name, predicted_winner, p1_id, p2_id, _ in pending:
+        result = results.get(row_id)
+        if not result:
+            continue
+        names = match_name.split(' vs ', 1)
+        p1_won = result['p1'] > result['p2']
+        actual_winner = names[0] if p1_won else names[1]
+        outcomes.append((
+            row_id, actual_winner, p1_id if p1_won else p2_id,
+            actual_winner == predicted_winner, result['finishedAt']
+        ))
+
+    settled = 0
+    if outcomes:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE predictions AS p SET
+                actual_winner = v.actual_winner,
+                actual_winner_id = v.actual_winner_id,
+                is_correct = v.is_correct,
+                match_finish_time = v.finish_time,
+                settlement_status = 'settled',
+                updated_at = NOW()
+            FROM (VALUES %s) AS v(id, actual_winner, actual_winner_id, is_correct, finish_time)
+            WHERE p.id = v.id AND p.is_correct IS NULL
+        """, outcomes, template='(%s::int, %s::varchar, %s::int, %s::boolean, %s::timestamptz)', page_size=len(outcomes))
+        settled = cur.rowcount
+
+    # Аннулируются только строки, которые искали во всех настроенных источниках и не нашли;
+    # недоступный источник или непросмотренная строка — повторная попытка в следующий запуск
+    void_ids = [
+        row[0] for row in pending
+        if row[0] not in results
+        and row[0] in sofascore_checked
+        and (not api_key or row[0] in apifootball_checked)
+    ]
+    voided = 0
+    if void_ids:
+        cur.execute("""
+            UPDATE predictions SET settlement_status = 'void', updated_at = NOW()
+            WHERE id = ANY(%s)
+              AND is_correct IS NULL
+              AND settlement_status IS NULL
+              AND match_start_time < NOW() - %s * INTERVAL '1 day'
+        """, (void_ids, SETTLE_VOID_AFTER_DAYS))
+        voided = cur.rowcount
+
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    print(f'Settled: {settled}, voided: {voided}')
+
+    return {
+        'statusCode': 200,
+        'headers': CORS_HEADERS,
+        'body': json.dumps({
+            'pending': len(pending),
+            'settled': settled,
+            'voided': voided,
+            'updatedAt': datetime.now(timezone.utc).isoformat()
+        }, ensure_ascii=False)
+    }
+
+
+def row_day(row):
+    return row[6].strftime('%Y-%m-%d')
+
+
+def fetch_snapshot_results(cur, match_ids):
+    """Завершённые матчи из таблицы events, которую пишет get-matches"""
+    try:
+        cur.execute("""
+            SELECT
+                payload->>'id',
+                (payload->'scores'->>'home')::int,
+                (payload->'scores'->>'away')::int,
+                updated_at,
+                payload->'teams'->'home'->>'name',
+                payload->'teams'->'away'->>'name',
+                (payload->'teams'->'home'->>'playerId')::int,
+                (payload->'teams'->'away'->>'playerId')::int
+            FROM events
+            WHERE status = 'finished' AND payload->>'id' = ANY(%s)
+            ORDER BY updated_at DESC
+        """, (match_ids,))
+    except Exception as e:
+        print(f'Snapshot results error: {str(e)}')
+        cur.connection.rollback()
+        return {}
+
+    # Одинаковый id может прийти из разных источников — храним всех кандидатов
+    results = {}
+    for row in cur.fetchall():
+        if row[1] is None or row[2] is None or row[1] == row[2]:
+            continue
+        results.setdefault(row[0], []).append({
+            'p1': row[1], 'p2': row[2], 'finishedAt': row[3],
+            'home': row[4] or '', 'away': row[5] or '', 'homeId': row[6], 'awayId': row[7]
+        })
+    return results
+
+
+def verify_results(rows, results, candidates):
+    """Результат для строки прогноза — первый кандидат с теми же игроками (с учётом порядка)"""
+    for row_id, match_id, match_name, _, p1_id, p2_id, _ in rows:
+        if row_id in results:
+            continue
+        names = match_name.split(' vs ', 1)
+        if len(names) != 2:
+            continue
+        for result in candidates.get(match_id, []):
+            if same_player(result['home'], result.get('homeId'), names[0], p1_id) and \
+                    same_player(result['away'], result.get('awayId'), names[1], p2_id):
+                results[row_id] = result
+                break
+            if same_player(result['home'], result.get('homeId'), names[1], p2_id) and \
+                    same_player(result['away'], result.get('awayId'), names[0], p1_id):
+                results[row_id] = {**result, 'p1': result['p2'], 'p2': result['p1']}
+                break
+
+
+def same_player(name, player_id, expected_name, expected_id):
+    if player_id and expected_id:
+        return player_id == expected_id
+    keys = name_keys(name)
+    expected = name_keys(expected_name)
+    if not keys or not expected:
+        return False
+    return alias_match(keys, expected) or alias_match(expected, keys)
+
+
+def normalize_name(name):
+    """Нормализация имени игрока — та же, что в get-matches"""
+    text = str(name).lower().translate(TRANSLIT)
+    text = re.sub(r'[^a-z0-9]+', ' ', text)
+    return ' '.join(text.split())
+
+
+def name_keys(name):
+    norm = normalize_name(name)
+    parts = norm.split()
+    if len(parts) < 2:
+        return [norm] if norm else []
+    first, last = parts[0], parts[-1]
+    keys = [norm, f'{last} {first}']
+    if len(first) > 1 and len(last) > 1:
+        keys += [f'{first} {last[0]}', f'{last} {first[0]}']
+    return list(dict.fromkeys(keys))
+
+
+def alias_match(keys, other):
+    """Полное имя совпадает только само с собой или с перестановкой; короткое («Иванов И.») — с любым ключом"""
+    if any(len(part) == 1 for part in keys[0].split()):
+        return keys[0] in other
+    return keys[0] in other[:2]
+
+
+def fetch_sofascore_json(url):
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+
+    headers = {
+        'User-Agent': UA,
+        'Accept': 'application/json',
+        'Referer': 'https://www.sofascore.com/',
+        'Origin': 'https://www.sofascore.com'
+    }
+
+    req = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(req, timeout=10, context=ctx) as resp:
+        return json.loads(resp.read().decode('utf-8'))
+
+
+def finished_result(ev):
+    if (ev.get('status') or {}).get('type') != 'finished':
+        return None
+    p1 = (ev.get('homeScore') or {}).get('current')
+    p2 = (ev.get('awayScore') or {}).get('current')
+    if p1 is None or p2 is None or p1 == p2:
+        return None
+    finished_at = ev.get('endTimestamp') or ev.get('startTimestamp')
+    return {
+        'p1': p1,
+        'p2': p2,
+        'home': (ev.get('homeTeam') or {}).get('name', ''),
+        'away': (ev.get('awayTeam') or {}).get('name', ''),
+        'finishedAt': datetime.fromtimestamp(finished_at, tz=timezone.utc) if finished_at else datetime.now(timezone.utc)
+    }
+
+
+def fetch_sofascore_day(day):
+    """События дня или None, если SofaScore не ответил"""
+    try:
+        data = fetch_sofascore_json(f'https://www.sofascore.com/api/v1/sport/table-tennis/scheduled-events/{day}')
+        return data.get('events', [])
+    except Exception as e:
+        print(f'SofaScore day {day} error: {str(e)}')
+        return None
+
+
+def fetch_sofascore_days(days, wanted):
+    """Один запрос на день расписания вместо запроса на каждый матч; возвращает и дни, на которые был ответ"""
+    results = {}
+    checked = set()
+    if not days:
+        return results, checked
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for day, events in zip(days, pool.map(fetch_sofascore_day, days)):
+            if events is None:
+                continue
+            checked.add(day)
+            for ev in events:
+                match_id = str(ev.get('id', ''))
+                if match_id in wanted:
+                    result = finished_result(ev)
+                    if result:
+                        results.setdefault(match_id, []).append(result)
+
+    print(f'Results from SofaScore days ({len(checked)}/{len(days)}): {len(results)}')
+    return results, checked
+
+
+def fetch_sofascore_event(match_id):
+    """(match_id, результат, ответил ли SofaScore); 404 — тоже ответ: такого матча у него нет"""
+    try:
+        data = fetch_sofascore_json(f'https://www.sofascore.com/api/v1/event/{match_id}')
+        return match_id, finished_result(data.get('event') or {}), True
+    except urllib.error.HTTPError as e:
+        print(f'SofaScore event {match_id} error: HTTP {e.code}')
+        return match_id, None, e.code == 404
+    except Exception as e:
+        print(f'SofaScore event {match_id} error: {str(e)}')
+        return match_id, None, False
+
+
+def fetch_sofascore_events(match_ids):
+    """Точечные запросы по оставшимся матчам с ограниченной параллельностью"""
+    results = {}
+    checked = set()
+    if not match_ids:
+        return results, checked
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for match_id, result, answered in pool.map(fetch_sofascore_event, match_ids):
+            if answered:
+                checked.add(match_id)
+            if result:
+                results[match_id] = [result]
+
+    print(f'Results from SofaScore events ({len(match_ids)}): {len(results)}')
+    return results, checked
+
+
+def apifootball_result(ev):
+    """Завершённый матч API-Football в формате кандидата; иначе None"""
+    status = ev.get('status') or {}
+    short = status.get('short', '') if isinstance(status, dict) else str(status)
+    if short not in APIFOOTBALL_FINISHED:
+        return None
+    scores = ev.get('scores') or {}
+    p1, p2 = scores.get('home'), scores.get('away')
+    if isinstance(p1, dict):
+        p1 = p1.get('total')
+    if isinstance(p2, dict):
+        p2 = p2.get('total')
+    if p1 is None or p2 is None or p1 == p2:
+        return None
+    teams = ev.get('teams') or {}
+    timestamp = ev.get('timestamp')
+    return {
+        'p1': p1,
+        'p2': p2,
+        'home': (teams.get('home') or {}).get('name', ''),
+        'away': (teams.get('away') or {}).get('name', ''),
+        'finishedAt': datetime.fromtimestamp(timestamp, tz=timezone.utc) if timestamp else datetime.now(timezone.utc)
+    }
+
+
+def fetch_apifootball_day(api_key, day):
+    """Матчи дня из API-Football (тот же RapidAPI-хост, что в get-matches) или None при ошибке"""
+    headers = {
+        'X-RapidAPI-Key': api_key,
+        'X-RapidAPI-Host': 'api-football-v1.p.rapidapi.com'
+    }
+    req = urllib.request.Request(f'https://api-football-v1.p.rapidapi.com/v3/games?date={day}', headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=20) as resp:
+            data = json.loads(resp.read().decode('utf-8'))
+    except Exception as e:
+        print(f'API-Football day {day} error: {str(e)}')
+        return None
+    if not isinstance(data.get('response'), list):
+        return None
+    return data['response']
+
+
+def fetch_apifootball_days(api_key, days, wanted):
+    """Запрос на день (не больше MAX_APIFOOTBALL_DAYS — квота общая с get-matches)"""
+    results = {}
+    checked = set()
+    for day in days:
+        events = fetch_apifootball_day(api_key, day)
+        if events is None:
+            continue
+        checked.add(day)
+        for ev in events:
+            match_id = str(ev.get('id', ''))
+            if match_id in wanted:
+                result = apifootball_result(ev)
+                if result:
+                    results.setdefault(match_id, []).append(result)
+
+    print(f'Results from API-Football days ({len(checked)}/{len(days)}): {len(results)}')
+    return results, checked
@@ -1,5 +1,7 @@
 import json
 import os
+import re
+import time
 import urllib.request
 from datetime import datetime, timezone
 
@@ -13,6 +15,14 @@ CORS_HEADERS = {
 
 MATCHES_URL = 'https://functions.poehali.dev/6a9f6c04-269b-4b4b-9151-6645433dba77'
 
+MD_SPECIAL = re.compile(r'([_*\[\]()~`>#+\-=|{}.!\\])')
+
+WIRE_STATUSES = {'LIVE': 'live', 'FT': 'finished', 'scheduled': 'upcoming'}
+
+FRAGMENT_TTL_SECONDS = 3600
+
+fragment_cache = {}
+
 
 def handler(event, context):
     """Отправка прогнозов матчей Лига Про в Telegram"""
@@ -34,7 +44,8 @@ def handler(event, context):
     if event.get('body'):
         body = json.loads(event['body'])
 
-    mode = body.get('mode', 'predictions')
+    modes = body.get('modes') or [body.get('mode', 'predictions')]
+    chat_ids = [c.strip() for c in chat_id.split(',') if c.strip()]
 
     matches_data = fetch_matches()
     if not matches_data:
@@ -44,16 +55,22 @@ def handler(event, context):
             'body': json.dumps({'error': 'Не удалось загрузить матчи'}, ensure_ascii=False)
         }
 
-    matches = matches_data.get('matches', [])
+    rows = prepare_rows(matches_data)
+    prune_fragments()
 
-    if mode == 'predictions':
-        text = build_predictions_message(matches)
-    elif mode == 'results':
-        text = build_results_message(matches)
-    else:
-        text = build_predictions_message(matches)
+    sent = 0
+    attempts = 0
+    for mode in modes:
+        if mode == 'results':
+            text = build_results_message(rows)
+        else:
+            text = build_predictions_message(rows)
+        for chat in chat_ids:
+            attempts += 1
+            if send_telegram(token, chat, text):
+                sent += 1
 
-    ok = send_telegram(token, chat_id, text)
+    ok = attempts > 0 and sent == attempts
 
     return {
         'statusCode': 200 if ok else 500,
@@ -61,6 +78,7 @@ def handler(event, context):
         'body': json.dumps({
             'success': ok,
             'message': 'Отправлено в Telegram!' if ok else 'Ошибка отправки',
+            'sent': sent,
             'sentAt': datetime.now(timezone.utc).isoformat()
         }, ensure_ascii=False)
     }
@@ -75,71 +93,150 @@ def fetch_matches():
         return None
 
 
+def md(text):
+    """Экранирование текста для parse_mode MarkdownV2"""
+    return MD_SPECIAL.sub(r'\\\1', str(text))
+
+
 def confidence_bar(c):
     filled = round(c / 10)
     return '▓' * filled + '░' * (10 - filled)
 
 
-def build_predictions_message(matches):
-    upcoming = [m for m in matches if m.get('status') in ('upcoming', 'live') and m.get('prediction')]
-    upcoming.sort(key=lambda m: m.get('prediction', {}).get('confidence', 0), reverse=True)
+def prepare_rows(data):
+    """Матчи из ответа get-matches → компактные строки, отсортированные по уверенности.
+
+    Понимает и формат фронтенда (matches: player1/player2), и формат get-matches
+    (events: teams.home/away). Время и статус разбираются один раз на вызов.
+    """
+    rows = []
+    for m in data.get('matches') or []:
+        rows.append(make_row(
+            m.get('id'), m.get('status'), (m.get('player1') or {}).get('name', ''),
+            (m.get('player2') or {}).get('name', ''), m.get('startTime'), m.get('odds'),
+            m.get('prediction'), m.get('score')
+        ))
+    for ev in data.get('events') or []:
+        teams = ev.get('teams') or {}
+        scores = ev.get('scores') or {}
+        score = None
+        if scores.get('home') is not None and scores.get('away') is not None:
+            score = {'p1': scores['home'], 'p2': scores['away']}
+        rows.append(make_row(
+            ev.get('id'), WIRE_STATUSES.get(ev.get('status'), 'upcoming'),
+            (teams.get('home') or {}).get('name', ''), (teams.get('away') or {}).get('name', ''),
+            ev.get('date'), ev.get('odds'), ev.get('prediction'), score
+        ))
+
+    rows = [r for r in rows if r['prediction']]
+    rows.sort(key=lambda r: r['prediction'].get('confidence', 0), reverse=True)
+    return rows
+
+
+def make_row(match_id, status, p1, p2, start_time, odds, prediction, score):
+    time_str = ''
+    try:
+        t = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+        time_str = t.strftime('%H:%M')
+    except Exception:
+        pass
+    return {
+        'id': str(match_id),
+        'status': status,
+        'p1': p1,
+        'p2': p2,
+        'time': time_str,
+        'odds': odds,
+        'prediction': prediction,
+        'score': (score['p1'], score['p2']) if score else None
+    }
+
+
+def prediction_key(row):
+    p = row['prediction']
+    odds = row['odds'] or {}
+    return (p.get('winner'), p.get('confidence'), odds.get('p1Win'), odds.get('p2Win'), row['status'], row['time'])
+
+
+def cached_fragment(kind, row, render):
+    """Markdown-фрагмент матча по (шаблон, match_id, хэш прогноза, счёт) — форматируется один раз"""
+    key = (kind, row['id'], hash(prediction_key(row)), row['score'])
+    entry = fragment_cache.get(key)
+    if entry:
+        entry[0] = time.time()
+        return entry[1]
+    text = render(row)
+    fragment_cache[key] = [time.time(), text]
+    return text
+
+
+def prune_fragments():
+    cutoff = time.time() - FRAGMENT_TTL_SECONDS
+    for key in [k for k, v in fragment_cache.items() if v[0] < cutoff]:
+        del fragment_cache[key]
 
+
+def message_header(title):
     now = datetime.now(timezone.utc)
-    lines = [f'🏓 *TT Predict — Прогнозы*', f'📅 {now.strftime("%d.%m.%Y %H:%M")} UTC', '']
+    return [f'{title}', md(f'📅 {now.strftime("%d.%m.%Y %H:%M")} UTC'), '']
+
+
+def build_predictions_message(rows):
+    upcoming = [r for r in rows if r['status'] in ('upcoming', 'live')]
+    lines = message_header('🏓 *TT Predict — Прогнозы*')
 
     if not upcoming:
         lines.append('_Нет активных прогнозов_')
         return '\n'.join(lines)
 
-    live = [m for m in upcoming if m['status'] == 'live']
-    soon = [m for m in upcoming if m['status'] == 'upcoming']
+    live = [r for r in upcoming if r['status'] == 'live']
+    soon = [r for r in upcoming if r['status'] == 'upcoming']
 
     if live:
         lines.append('🔴 *LIVE*')
-        for m in live[:5]:
-            lines.append(format_prediction(m))
+        for r in live[:5]:
+            lines.append(cached_fragment('prediction', r, format_prediction))
         lines.append('')
 
     if soon:
         lines.append('⏳ *Ожидаемые*')
-        for m in soon[:8]:
-            lines.append(format_prediction(m))
+        for r in soon[:8]:
+            lines.append(cached_fragment('prediction', r, format_prediction))
 
-    high_conf = [m for m in upcoming if m['prediction']['confidence'] >= 75]
+    high_conf = sum(1 for r in upcoming if r['prediction']['confidence'] >= 75)
     if high_conf:
         lines.append('')
-        lines.append(f'💎 Топ-прогнозы (>75%): *{len(high_conf)}* матчей')
+        lines.append(f'💎 {md("Топ-прогнозы (>75%):")} *{high_conf}* матчей')
 
     return '\n'.join(lines)
 
 
-def format_prediction(m):
-    p = m['prediction']
-    winner_name = m['player1']['name'] if p['winner'] == 'p1' else m['player2']['name']
-    odds = m['odds']['p1Win'] if p['winner'] == 'p1' else m['odds']['p2Win']
+def format_prediction(r):
+    p = r['prediction']
+    predicted_p1 = p['winner'] == 'p1'
+    winner_name = r['p1'] if predicted_p1 else r['p2']
     conf = p['confidence']
 
-    status_icon = '🔴' if m['status'] == 'live' else '⏰'
-    time_str = ''
-    try:
-        t = datetime.fromisoformat(m['startTime'].replace('Z', '+00:00'))
-        time_str = t.strftime('%H:%M')
-    except Exception:
-        pass
+    odds_str = ''
+    if r['odds']:
+        odds = r['odds']['p1Win'] if predicted_p1 else r['odds']['p2Win']
+        odds_str = f' | Кф. {odds:.2f}'
 
+    status_icon = '🔴' if r['status'] == 'live' else '⏰'
     conf_emoji = '🟢' if conf >= 75 else ('🟡' if conf >= 60 else '⚪')
 
+    details = md(f'— {conf}%{odds_str}')
+
     return (
-        f'{status_icon} `{time_str}` *{m["player1"]["name"]}* vs *{m["player2"]["name"]}*\n'
-        f'   {conf_emoji} Прогноз: *{winner_name}* — {conf}% | Кф. {odds:.2f}\n'
+        f'{status_icon} `{r["time"]}` *{md(r["p1"])}* vs *{md(r["p2"])}*\n'
+        f'   {conf_emoji} Прогноз: *{md(winner_name)}* {details}\n'
         f'   `{confidence_bar(conf)}`'
     )
 
 
-def build_results_message(matches):
-    finished = [m for m in matches if m.get('status') == 'finished' and m.get('prediction') and m.get('score')]
-    now = datetime.now(timezone.utc)
-    lines = [f'🏆 *TT Predict — Результаты*', f'📅 {now.strftime("%d.%m.%Y %H:%M")} UTC', '']
+def build_results_message(rows):
+    finished = [r for r in rows if r['status'] == 'finished' and r['score']]
+    lines = message_header('🏆 *TT Predict — Результаты*')
 
     if not finished:
         lines.append('_Нет завершённых матчей_')
@@ -148,36 +245,39 @@ def build_results_message(matches):
     correct = 0
     total = len(finished)
 
-    for m in finished:
-        p = m['prediction']
-        predicted_p1 = p['winner'] == 'p1'
-        p1_won = m['score']['p1'] > m['score']['p2']
-        is_correct = predicted_p1 == p1_won
-        if is_correct:
+    for r in finished:
+        if (r['prediction']['winner'] == 'p1') == (r['score'][0] > r['score'][1]):
             correct += 1
-
-        icon = '✅' if is_correct else '❌'
-        winner_name = m['player1']['name'] if predicted_p1 else m['player2']['name']
-        score_str = f"{m['score']['p1']}:{m['score']['p2']}"
-
-        lines.append(
-            f'{icon} *{m["player1"]["name"]}* vs *{m["player2"]["name"]}* — {score_str}\n'
-            f'   Прогноз: {winner_name} ({p["confidence"]}%)'
-        )
+        lines.append(cached_fragment('result', r, format_result))
 
     winrate = round(correct / total * 100, 1)
     lines.append('')
-    lines.append(f'📊 Итого: *{correct}/{total}* ({winrate}%)')
+    lines.append(f'📊 Итого: *{correct}/{total}* ' + md(f'({winrate}%)'))
 
     return '\n'.join(lines)
 
 
+def format_result(r):
+    p = r['prediction']
+    predicted_p1 = p['winner'] == 'p1'
+    p1_won = r['score'][0] > r['score'][1]
+    icon = '✅' if predicted_p1 == p1_won else '❌'
+    winner_name = r['p1'] if predicted_p1 else r['p2']
+
+    verdict = md(f'{winner_name} ({p["confidence"]}%)')
+
+    return (
+        f'{icon} *{md(r["p1"])}* vs *{md(r["p2"])}* — {r["score"][0]}:{r["score"][1]}\n'
+        f'   Прогноз: {verdict}'
+    )
+
+
 def send_telegram(token, chat_id, text):
     url = f'https://api.telegram.org/bot{token}/sendMessage'
     payload = json.dumps({
         'chat_id': chat_id,
         'text': text,
-        'parse_mode': 'Markdown',
+        'parse_mode': 'MarkdownV2',
         'disable_web_page_preview': True
     }).encode('utf-8')
 
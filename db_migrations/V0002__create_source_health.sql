@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS source_health (
+    source VARCHAR(50) PRIMARY KEY,
+    state VARCHAR(20) NOT NULL DEFAULT 'closed',
+    failures INTEGER NOT NULL DEFAULT 0,
+    cooldown_seconds INTEGER NOT NULL DEFAULT 60,
+    opened_until TIMESTAMPTZ,
+    last_error VARCHAR(300),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS schedule_cache (
+    source VARCHAR(50) NOT NULL,
+    day DATE NOT NULL,
+    payload JSONB NOT NULL,
+    fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (source, day)
+);
@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS events (
+    id VARCHAR(150) PRIMARY KEY,
+    source VARCHAR(50) NOT NULL,
+    league VARCHAR(200) NOT NULL DEFAULT '',
+    status VARCHAR(20) NOT NULL,
+    start_time TIMESTAMPTZ NOT NULL,
+    payload JSONB NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX idx_events_status_start_time ON events(status, start_time);
+CREATE INDEX idx_events_start_time ON events(start_time);
+CREATE INDEX idx_events_league ON events(league);
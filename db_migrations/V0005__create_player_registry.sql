@@ -0,0 +1,22 @@
+CREATE TABLE IF NOT EXISTS players (
+    id SERIAL PRIMARY KEY,
+    canonical_name VARCHAR(100) NOT NULL,
+    normalized_name VARCHAR(100) NOT NULL UNIQUE,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS player_aliases (
+    alias_key VARCHAR(150) PRIMARY KEY,
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    alias VARCHAR(100) NOT NULL,
+    source VARCHAR(50),
+    source_player_id VARCHAR(100),
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX idx_player_aliases_player_id ON player_aliases(player_id);
+
+ALTER TABLE predictions ADD COLUMN IF NOT EXISTS p1_player_id INTEGER REFERENCES players(id);
+ALTER TABLE predictions ADD COLUMN IF NOT EXISTS p2_player_id INTEGER REFERENCES players(id);
+ALTER TABLE predictions ADD COLUMN IF NOT EXISTS predicted_winner_id INTEGER REFERENCES players(id);
+ALTER TABLE predictions ADD COLUMN IF NOT EXISTS actual_winner_id INTEGER REFERENCES players(id);
@@ -0,0 +1,5 @@
+ALTER TABLE predictions ADD COLUMN IF NOT EXISTS settlement_status VARCHAR(20);
+
+UPDATE predictions SET settlement_status = 'settled' WHERE is_correct IS NOT NULL;
+
+CREATE INDEX idx_predictions_pending ON predictions(match_start_time) WHERE is_correct IS NULL AND settlement_status IS NULL;
@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS api_quota (
+    provider VARCHAR(50) PRIMARY KEY,
+    remaining INTEGER NOT NULL,
+    request_limit INTEGER,
+    reset_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS odds_history (
+    event_id VARCHAR(150) NOT NULL,
+    ts TIMESTAMPTZ NOT NULL,
+    p1_odds SMALLINT NOT NULL,
+    p2_odds SMALLINT NOT NULL,
+    set_no SMALLINT NOT NULL DEFAULT 0,
+    resolution VARCHAR(10) NOT NULL DEFAULT 'tick',
+    PRIMARY KEY (event_id, ts)
+);
+
+CREATE INDEX idx_odds_history_resolution_ts ON odds_history(resolution, ts);
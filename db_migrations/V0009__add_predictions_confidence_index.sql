@@ -0,0 +1 @@
+CREATE INDEX idx_predictions_correct_confidence ON predictions(is_correct, confidence);
@@ -0,0 +1,5 @@
+CREATE TABLE IF NOT EXISTS proxy_rate_limit (
+    name VARCHAR(50) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
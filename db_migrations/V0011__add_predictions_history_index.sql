@@ -0,0 +1,5 @@
+CREATE INDEX idx_predictions_history ON predictions(created_at DESC, id DESC)
+    INCLUDE (match_id, match_name, league, predicted_winner, actual_winner, confidence, bet_type,
+             p1_odds, p2_odds, is_correct, settlement_status, match_start_time);
+
+CREATE INDEX idx_predictions_league_history ON predictions(league, created_at DESC, id DESC);
@@ -0,0 +1,10 @@
+-- Короткие формы «Фамилия И.» выносятся в отдельное пространство ключей «~ключ#player_id»:
+-- одну короткую форму могут делить несколько игроков, и каждый получает свою строку
+UPDATE player_aliases a
+SET alias_key = '~' || a.alias_key || '#' || a.player_id
+FROM players p
+WHERE p.id = a.player_id
+  AND a.alias_key NOT LIKE '#%'
+  AND a.alias_key NOT LIKE '~%'
+  AND a.alias_key ~ '(^| )[a-z0-9]( |$)'
+  AND p.normalized_name !~ '(^| )[a-z0-9]( |$)';
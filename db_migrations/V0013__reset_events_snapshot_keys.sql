@@ -0,0 +1,3 @@
+-- Снапшот теперь ключуется по источнику события, а не по метке сбора («flashscore-sofascore»);
+-- старые строки дублировали бы новые до истечения хранения, снапшот пересоберётся первым же сбором
+DELETE FROM events;
@@ -12,11 +12,16 @@ import {
   Cell,
   PieChart,
   Pie,
+  LineChart,
+  Line,
+  ReferenceLine,
 } from 'recharts';
 import type { Match } from '@/data/matches';
+import type { DbStats } from '@/hooks/use-stats';
 
 interface AnalyticsPanelProps {
   matches: Match[];
+  stats?: DbStats;
 }
 
 const tooltipStyle = {
@@ -31,8 +36,19 @@ const tooltipStyle = {
   labelStyle: { color: 'hsl(215 15% 55%)' },
 };
 
-export default function AnalyticsPanel({ matches }: AnalyticsPanelProps) {
+const betTypeLabels: Record<string, string> = {
+  strong: 'Топ',
+  medium: 'Средний',
+  risky: 'Риск',
+  unknown: 'Без типа',
+};
+
+export default function AnalyticsPanel({ matches, stats }: AnalyticsPanelProps) {
+  // Распределения строятся по всей истории из get-stats; загруженная страница — только без неё
   const confidenceData = useMemo(() => {
+    if (stats?.calibration.length) {
+      return stats.calibration.map(b => ({ range: b.bucket, min: parseInt(b.bucket, 10), count: b.total }));
+    }
     const ranges = [
       { range: '48-55', min: 48, max: 55, count: 0 },
       { range: '55-65', min: 55, max: 65, count: 0 },
@@ -47,10 +63,17 @@ export default function AnalyticsPanel({ matches }: AnalyticsPanelProps) {
         if (c >= r.min && c <= r.max) { r.count++; break; }
       }
     }
-    return ranges.map(r => ({ range: r.range, count: r.count }));
-  }, [matches]);
+    return ranges.map(r => ({ range: r.range, min: r.min, count: r.count }));
+  }, [matches, stats]);
 
   const leagueData = useMemo(() => {
+    if (stats?.byLeague.length) {
+      return stats.byLeague.map(l => ({
+        league: l.league.replace('Лига Про ', ''),
+        winrate: Math.round(l.winRate),
+        count: l.total,
+      }));
+    }
     const leagues: Record<string, { total: number; correct: number }> = {};
     for (const m of matches) {
       if (m.status !== 'finished' || !m.prediction || !m.score) continue;
@@ -66,7 +89,17 @@ export default function AnalyticsPanel({ matches }: AnalyticsPanelProps) {
       winrate: d.total > 0 ? Math.round((d.correct / d.total) * 100) : 0,
       count: d.total,
     }));
-  }, [matches]);
+  }, [matches, stats]);
+
+  const calibrationData = stats?.calibration ?? [];
+
+  const betTypeData = useMemo(
+    () => (stats?.byBetType ?? []).map(b => ({ ...b, label: betTypeLabels[b.betType] ?? b.betType })),
+    [stats],
+  );
+
+  // get-stats отдаёт последние дни по убыванию даты — для графика нужен хронологический порядок
+  const roiData = useMemo(() => [...(stats?.roiSeries ?? [])].reverse(), [stats]);
 
   const statusData = useMemo(() => {
     const live = matches.filter(m => m.status === 'live').length;
@@ -84,7 +117,9 @@ export default function AnalyticsPanel({ matches }: AnalyticsPanelProps) {
       <div className="flex items-center gap-2 mb-2">
         <Icon name="BarChart3" size={20} className="text-primary" />
         <h2 className="text-lg font-bold text-foreground">Аналитика</h2>
-        <span className="text-xs text-muted-foreground ml-auto">{matches.length} матчей загружено</span>
+        <span className="text-xs text-muted-foreground ml-auto">
+          {stats ? `${stats.total} прогнозов в истории · ` : ''}{matches.length} матчей загружено
+        </span>
       </div>
 
       <div className="grid grid-cols-1 lg:grid-cols-2 gap-4">
@@ -111,10 +146,10 @@ export default function AnalyticsPanel({ matches }: AnalyticsPanelProps) {
                 {...tooltipStyle}
               />
               <Bar dataKey="count" radius={[4, 4, 0, 0]}>
-                {confidenceData.map((_, index) => (
+                {confidenceData.map((entry, index) => (
                   <Cell
                     key={index}
-                    fill={index >= 3 ? '#22c55e' : index >= 1 ? '#3b82f6' : '#64748b'}
+                    fill={entry.min >= 75 ? '#22c55e' : entry.min >= 55 ? '#3b82f6' : '#64748b'}
                   />
                 ))}
               </Bar>
@@ -153,6 +188,105 @@ export default function AnalyticsPanel({ matches }: AnalyticsPanelProps) {
           </div>
         </Card>
 
+        {calibrationData.length > 0 && (
+          <Card className="p-5 border-border/50 lg:col-span-2">
+            <h3 className="text-sm font-semibold text-foreground mb-4">
+              Калибровка: уверенность vs фактический винрейт
+            </h3>
+            <ResponsiveContainer width="100%" height={220}>
+              <BarChart data={calibrationData}>
+                <CartesianGrid strokeDasharray="3 3" stroke="#1e293b" />
+                <XAxis
+                  dataKey="bucket"
+                  tick={{ fill: '#64748b', fontSize: 12 }}
+                  axisLine={{ stroke: '#1e293b' }}
+                  tickLine={false}
+                />
+                <YAxis
+                  domain={[0, 100]}
+                  tick={{ fill: '#64748b', fontSize: 12 }}
+                  axisLine={{ stroke: '#1e293b' }}
+                  tickLine={false}
+                  tickFormatter={(v) => `${v}%`}
+                />
+                <Tooltip
+                  formatter={(value: number, name: string) => [`${value}%`, name === 'predicted' ? 'Уверенность' : 'Факт']}
+                  {...tooltipStyle}
+                />
+                <Bar dataKey="predicted" radius={[4, 4, 0, 0]} fill="#3b82f6" />
+                <Bar dataKey="actual" radius={[4, 4, 0, 0]} fill="#22c55e" />
+              </BarChart>
+            </ResponsiveContainer>
+          </Card>
+        )}
+
+        {betTypeData.length > 0 && (
+          <Card className="p-5 border-border/50">
+            <h3 className="text-sm font-semibold text-foreground mb-4">
+              Винрейт и ROI по типу ставки
+            </h3>
+            <ResponsiveContainer width="100%" height={220}>
+              <BarChart data={betTypeData}>
+                <CartesianGrid strokeDasharray="3 3" stroke="#1e293b" />
+                <XAxis
+                  dataKey="label"
+                  tick={{ fill: '#64748b', fontSize: 12 }}
+                  axisLine={{ stroke: '#1e293b' }}
+                  tickLine={false}
+                />
+                <YAxis
+                  tick={{ fill: '#64748b', fontSize: 12 }}
+                  axisLine={{ stroke: '#1e293b' }}
+                  tickLine={false}
+                  tickFormatter={(v) => `${v}%`}
+                />
+                <ReferenceLine y={0} stroke="#475569" />
+                <Tooltip
+                  formatter={(value: number, name: string) => [`${value}%`, name === 'winRate' ? 'Винрейт' : 'ROI']}
+                  {...tooltipStyle}
+                />
+                <Bar dataKey="winRate" radius={[4, 4, 0, 0]} fill="#3b82f6" />
+                <Bar dataKey="roi" radius={[4, 4, 0, 0]}>
+                  {betTypeData.map((entry, index) => (
+                    <Cell key={index} fill={entry.roi >= 0 ? '#22c55e' : '#ef4444'} />
+                  ))}
+                </Bar>
+              </BarChart>
+            </ResponsiveContainer>
+          </Card>
+        )}
+
+        {roiData.length > 0 && (
+          <Card className="p-5 border-border/50">
+            <h3 className="text-sm font-semibold text-foreground mb-4">
+              Накопленная прибыль (ставка = 1)
+            </h3>
+            <ResponsiveContainer width="100%" height={220}>
+              <LineChart data={roiData}>
+                <CartesianGrid strokeDasharray="3 3" stroke="#1e293b" />
+                <XAxis
+                  dataKey="date"
+                  tick={{ fill: '#64748b', fontSize: 12 }}
+                  axisLine={{ stroke: '#1e293b' }}
+                  tickLine={false}
+                  tickFormatter={(v: string) => v.slice(5)}
+                />
+                <YAxis
+                  tick={{ fill: '#64748b', fontSize: 12 }}
+                  axisLine={{ stroke: '#1e293b' }}
+                  tickLine={false}
+                />
+                <ReferenceLine y={0} stroke="#475569" />
+                <Tooltip
+                  formatter={(value: number) => [value, 'Прибыль']}
+                  {...tooltipStyle}
+                />
+                <Line type="monotone" dataKey="cumulativeProfit" stroke="#22c55e" strokeWidth={2} dot={false} />
+              </LineChart>
+            </ResponsiveContainer>
+          </Card>
+        )}
+
         {leagueData.length > 0 && (
           <Card className="p-5 border-border/50 lg:col-span-2">
             <h3 className="text-sm font-semibold text-foreground mb-4">
@@ -1,5 +1,6 @@
 export interface Player {
   id: string;
+  playerId?: number;
   name: string;
   rating: number;
   winRate: number;
@@ -282,11 +283,11 @@ function parseApiSportsEvent(ev: Record<string, unknown>): Match | null {
     
     const match: Match = {
       id: String(ev.id),
-      player1: { id: String(home.id || p1n), name: p1n, rating: r1, winRate: winrate(r1), recentForm: form(p1n), country: 'RU' },
-      player2: { id: String(away.id || p2n), name: p2n, rating: r2, winRate: winrate(r2), recentForm: form(p2n), country: 'RU' },
+      player1: { id: String(home.id || p1n), playerId: Number(home.playerId) || undefined, name: p1n, rating: r1, winRate: winrate(r1), recentForm: form(p1n), country: 'RU' },
+      player2: { id: String(away.id || p2n), playerId: Number(away.playerId) || undefined, name: p2n, rating: r2, winRate: winrate(r2), recentForm: form(p2n), country: 'RU' },
       startTime: String(ev.date || new Date().toISOString()),
       status,
-      odds: odds(r1, r2),
+      odds: (ev.odds as Match['odds']) || odds(r1, r2),
       league: leagueName
     };
     
@@ -298,7 +299,10 @@ function parseApiSportsEvent(ev: Record<string, unknown>): Match | null {
       match.score = { p1: homeScore, p2: awayScore };
     }
     
-    match.prediction = predict(match);
+    const sets = ev.sets as { p1: number; p2: number }[] | undefined;
+    if (status !== 'upcoming' && sets && sets.length) match.sets = sets;
+    
+    match.prediction = (ev.prediction as Match['prediction']) || predict(match);
     return match;
   } catch {
     return null;
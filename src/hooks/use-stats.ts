@@ -1,4 +1,4 @@
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import type { Match } from '@/data/matches';
 
 const STATS_URL = 'https://functions.poehali.dev/f77f3d82-2bdf-4aa6-8b2e-d8d33e745a37';
@@ -19,6 +19,9 @@ export interface DbStats {
   riskyCount: number;
   byLeague: { league: string; winRate: number; total: number; correct: number }[];
   daily: { date: string; winRate: number; total: number; correct: number }[];
+  calibration: { bucket: string; total: number; predicted: number; actual: number }[];
+  byBetType: { betType: string; total: number; correct: number; winRate: number; roi: number }[];
+  roiSeries: { date: string; bets: number; profit: number; cumulativeProfit: number; roi: number }[];
   updatedAt: string;
 }
 
@@ -35,6 +38,74 @@ export function useStats(period: string = 'all') {
   });
 }
 
+export interface PredictionHistoryItem {
+  id: number;
+  createdAt: string;
+  matchId: string;
+  matchName: string;
+  league: string;
+  predictedWinner: string;
+  actualWinner: string | null;
+  confidence: number;
+  betType: string | null;
+  p1Odds: number | null;
+  p2Odds: number | null;
+  status: 'won' | 'lost' | 'pending' | 'void';
+  startTime: string | null;
+}
+
+export interface PredictionHistoryFilters {
+  league?: string;
+  betType?: string;
+  status?: PredictionHistoryItem['status'];
+  from?: string;
+  to?: string;
+}
+
+interface PredictionHistoryPage {
+  items: PredictionHistoryItem[];
+  nextCursor: string | null;
+}
+
+export function usePredictionHistory(filters: PredictionHistoryFilters = {}) {
+  return useInfiniteQuery<PredictionHistoryPage>({
+    queryKey: ['prediction-history', filters],
+    initialPageParam: null,
+    queryFn: async ({ pageParam }) => {
+      const params = new URLSearchParams({ view: 'history' });
+      for (const [key, value] of Object.entries(filters)) {
+        if (value) params.set(key, value);
+      }
+      if (pageParam) params.set('cursor', pageParam as string);
+      const res = await fetch(`${STATS_URL}?${params}`);
+      if (!res.ok) throw new Error('Failed to fetch prediction history');
+      return res.json();
+    },
+    getNextPageParam: (last) => last.nextCursor,
+    staleTime: 30000,
+  });
+}
+
+// Только поля, которые хранит таблица predictions, — без factors, sets и вложенных игроков
+function toSaveRecord(m: Match) {
+  return {
+    id: m.id,
+    league: m.league,
+    startTime: m.startTime,
+    status: m.status,
+    p1: m.player1.name,
+    p2: m.player2.name,
+    p1Id: m.player1.playerId,
+    p2Id: m.player2.playerId,
+    winner: m.prediction?.winner,
+    confidence: m.prediction?.confidence,
+    betType: m.prediction?.betType,
+    p1Odds: m.odds?.p1Win,
+    p2Odds: m.odds?.p2Win,
+    score: m.score,
+  };
+}
+
 export function useSavePredictions() {
   const queryClient = useQueryClient();
 
@@ -42,14 +113,15 @@ export function useSavePredictions() {
     mutationFn: async (matches: Match[]) => {
       const res = await fetch(SAVE_URL, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ matches }),
+        headers: { 'Content-Type': 'application/x-ndjson' },
+        body: matches.filter(m => m.prediction).map(m => JSON.stringify(toSaveRecord(m))).join('\n'),
       });
       if (!res.ok) throw new Error('Failed to save predictions');
       return res.json();
     },
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ['stats'] });
+      queryClient.invalidateQueries({ queryKey: ['prediction-history'] });
     },
   });
 }
\ No newline at end of file
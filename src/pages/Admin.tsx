@@ -5,6 +5,7 @@ import { Input } from '@/components/ui/input';
 import Icon from '@/components/ui/icon';
 import { Badge } from '@/components/ui/badge';
 import { useLiveMatcher } from '@/hooks/use-live-matcher';
+import { usePredictionHistory, type PredictionHistoryItem } from '@/hooks/use-stats';
 
 interface ManualMatch {
   id: string;
@@ -15,6 +16,21 @@ interface ManualMatch {
   score?: { p1: number; p2: number };
 }
 
+const HISTORY_STATUSES: { value?: PredictionHistoryItem['status']; label: string }[] = [
+  { label: 'Все' },
+  { value: 'won', label: 'Угадано' },
+  { value: 'lost', label: 'Не угадано' },
+  { value: 'pending', label: 'Ожидают' },
+  { value: 'void', label: 'Аннулированы' },
+];
+
+const HISTORY_BADGES: Record<PredictionHistoryItem['status'], string> = {
+  won: 'bg-green-500/15 text-green-400 border-green-500/30',
+  lost: 'bg-red-500/15 text-red-400 border-red-500/30',
+  pending: 'bg-amber-500/15 text-amber-400 border-amber-500/30',
+  void: 'bg-muted text-muted-foreground border-border',
+};
+
 export default function Admin() {
   const [matches, setMatches] = useState<ManualMatch[]>([]);
   const [p1, setP1] = useState('');
@@ -25,6 +41,9 @@ export default function Admin() {
   const [score2, setScore2] = useState('');
   
   const { liveMatches, loading, findMatch } = useLiveMatcher();
+  const [historyStatus, setHistoryStatus] = useState<PredictionHistoryItem['status'] | undefined>();
+  const history = usePredictionHistory({ status: historyStatus });
+  const historyItems = history.data?.pages.flatMap(p => p.items) ?? [];
   
   useEffect(() => {
     const stored = localStorage.getItem('manual_matches');
@@ -301,6 +320,66 @@ export default function Admin() {
             </div>
           )}
         </Card>
+
+        <Card className="p-6 border-border/50">
+          <div className="flex items-center justify-between mb-4 gap-2 flex-wrap">
+            <h2 className="text-lg font-bold flex items-center gap-2">
+              <Icon name="History" size={20} className="text-primary" />
+              История прогнозов
+            </h2>
+            <div className="flex items-center gap-1 flex-wrap">
+              {HISTORY_STATUSES.map(s => (
+                <Button
+                  key={s.label}
+                  variant={historyStatus === s.value ? 'default' : 'ghost'}
+                  size="sm"
+                  onClick={() => setHistoryStatus(s.value)}
+                >
+                  {s.label}
+                </Button>
+              ))}
+            </div>
+          </div>
+
+          {historyItems.length === 0 ? (
+            <div className="text-center py-8 text-muted-foreground">
+              <Icon name="Inbox" size={40} className="mx-auto mb-2 opacity-50" />
+              <p className="text-sm">{history.isLoading ? 'Загрузка...' : 'Нет прогнозов'}</p>
+            </div>
+          ) : (
+            <div className="space-y-2">
+              {historyItems.map((p) => (
+                <div key={p.id} className="flex items-center justify-between p-3 bg-muted/30 rounded-lg">
+                  <div className="flex-1">
+                    <div className="text-sm font-medium mb-1">{p.matchName}</div>
+                    <div className="flex items-center gap-2">
+                      <span className="text-xs text-muted-foreground">{p.league}</span>
+                      <span className="text-xs text-muted-foreground">
+                        {new Date(p.createdAt).toLocaleString('ru-RU')}
+                      </span>
+                    </div>
+                  </div>
+                  <div className="flex items-center gap-2">
+                    <span className="text-xs">{p.predictedWinner}</span>
+                    <span className="text-xs font-mono text-primary">{p.confidence}%</span>
+                    <Badge className={`${HISTORY_BADGES[p.status]} text-xs`}>{p.status}</Badge>
+                  </div>
+                </div>
+              ))}
+              {history.hasNextPage && (
+                <Button
+                  variant="ghost"
+                  className="w-full"
+                  onClick={() => history.fetchNextPage()}
+                  disabled={history.isFetchingNextPage}
+                >
+                  <Icon name="ChevronDown" size={16} />
+                  Загрузить ещё
+                </Button>
+              )}
+            </div>
+          )}
+        </Card>
       </div>
     </div>
   );
@@ -195,7 +195,7 @@ export default function Index() {
       case 'analytics':
         return (
           <div className="animate-fade-in">
-            <AnalyticsPanel matches={matches} />
+            <AnalyticsPanel matches={matches} stats={dbStats} />
           </div>
         );
 